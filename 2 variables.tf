@@ -38,3 +38,74 @@ variable "region" {
   type        = string
   default     = "eu-north-1"
 }
+
+variable "s3_codec" {
+  description = "Compression for objects written to the raw/processed buckets by the Lambdas and Glue jobs (common/codec.py)"
+  type        = string
+  default     = "gzip"
+
+  validation {
+    condition     = contains(["gzip", "zstd", "none"], var.s3_codec)
+    error_message = "s3_codec must be gzip, zstd or none (zstd needs the zstandard package in the Lambda layer)."
+  }
+}
+
+variable "etl_max_shards" {
+  description = "Maximum concurrent forecast_etl shard runs in the RunETLBackfill Map state"
+  type        = number
+  default     = 8
+}
+
+variable "etl_streaming" {
+  description = "forecast_etl streaming mode: transform files in batches and write them as a multipart upload"
+  type        = bool
+  default     = false
+}
+
+variable "etl_stream_batch_files" {
+  description = "Raw files per batch in forecast_etl streaming mode"
+  type        = number
+  default     = 100
+}
+
+variable "etl_rollups" {
+  description = "Maintain the daily/weekly rollups in forecast_etl"
+  type        = bool
+  default     = true
+}
+
+variable "etl_accuracy" {
+  description = "Maintain the forecast-vs-measured accuracy table in forecast_etl"
+  type        = bool
+  default     = true
+}
+
+variable "etl_location_map" {
+  description = "location_id -> canonical location_key for the rollup, accuracy and forecast_fact_latest tables; \"*\" maps every other id"
+  type        = map(number)
+  default     = { "*" = 1 }
+}
+
+variable "etl_solar_kwh_per_kwh_m2" {
+  description = "Measured panel kWh per forecast kWh/m2 of irradiation (panel area x efficiency), used by the accuracy table"
+  type        = number
+  default     = 1.0
+}
+
+variable "etl_forecast_dedup" {
+  description = "Maintain forecast_fact_latest (latest forecast per location and hour) in forecast_etl"
+  type        = bool
+  default     = true
+}
+
+variable "etl_forecast_history_issues" {
+  description = "Latest forecast issues kept per location and hour in forecast_fact_latest (issue_rank 1..N)"
+  type        = number
+  default     = 1
+}
+
+variable "etl_trace_profile" {
+  description = "cProfile forecast_etl runs; stats go to profiles/ in the processed bucket (common/tracing.py)"
+  type        = bool
+  default     = false
+}
@@ -35,6 +35,12 @@ resource "aws_sfn_state_machine" "forecast_pipeline" {
             Variable     = "$.action",
             StringEquals = "RunCrawler",
             Next         = "RunCrawler"
+          },
+          {
+            # input: {"action": "RunETLBackfill", "shard_count": 4, "shard_prefixes": "all"}
+            Variable     = "$.action",
+            StringEquals = "RunETLBackfill",
+            Next         = "PlanETLShards"
           }
         ],
         Default = "MeasureIngest" # fallback if no match
@@ -95,6 +101,86 @@ resource "aws_sfn_state_machine" "forecast_pipeline" {
         ]
       },
 
+      # --- Sharded forecast_etl: one Glue run per key-hash slice, then one merge run ---
+      PlanETLShards = {
+        Type = "Pass",
+        Parameters = {
+          "shard_indexes.$"  = "States.ArrayRange(0, States.MathAdd($.shard_count, -1), 1)",
+          "shard_count.$"    = "States.Format('{}', $.shard_count)",
+          "shard_prefixes.$" = "$.shard_prefixes"
+        },
+        Next = "RunETLShards"
+      },
+
+      RunETLShards = {
+        Type           = "Map",
+        ItemsPath      = "$.shard_indexes",
+        MaxConcurrency = var.etl_max_shards,
+        ItemSelector = {
+          "shard_index.$"    = "States.Format('{}', $$.Map.Item.Value)",
+          "shard_count.$"    = "$.shard_count",
+          "shard_prefixes.$" = "$.shard_prefixes"
+        },
+        ItemProcessor = {
+          ProcessorConfig = { Mode = "INLINE" },
+          StartAt         = "RunETLShard",
+          States = {
+            RunETLShard = {
+              Type     = "Task",
+              Resource = "arn:aws:states:::glue:startJobRun.sync",
+              Parameters = {
+                JobName = aws_glue_job.forecast_etl.name,
+                Arguments = {
+                  "--ETL_MODE"         = "shard",
+                  "--SHARD_INDEX.$"    = "$.shard_index",
+                  "--SHARD_COUNT.$"    = "$.shard_count",
+                  "--SHARD_PREFIXES.$" = "$.shard_prefixes",
+                  "--RUN_ID.$"         = "$$.Execution.Name"
+                }
+              },
+              Retry = [
+                {
+                  ErrorEquals     = ["Glue.AWSGlueException", "Glue.SdkClientException", "Glue.ConcurrentRunsExceededException"],
+                  IntervalSeconds = 30,
+                  MaxAttempts     = 3,
+                  BackoffRate     = 2.0
+                }
+              ],
+              End = true
+            }
+          }
+        },
+        ResultPath = null,
+        Next       = "MergeETLShards",
+        Catch = [
+          { ErrorEquals = ["States.ALL"], Next = "FailState" }
+        ]
+      },
+
+      MergeETLShards = {
+        Type     = "Task",
+        Resource = "arn:aws:states:::glue:startJobRun.sync",
+        Parameters = {
+          JobName = aws_glue_job.forecast_etl.name,
+          Arguments = {
+            "--ETL_MODE" = "merge",
+            "--RUN_ID.$" = "$$.Execution.Name"
+          }
+        },
+        Next = "RunCrawler",
+        Retry = [
+          {
+            ErrorEquals     = ["Glue.AWSGlueException", "Glue.SdkClientException"],
+            IntervalSeconds = 30,
+            MaxAttempts     = 2,
+            BackoffRate     = 2.0
+          }
+        ],
+        Catch = [
+          { ErrorEquals = ["States.ALL"], Next = "FailState" }
+        ]
+      },
+
       RunCrawler = {
         Type     = "Task",
         Resource = "arn:aws:states:::aws-sdk:glue:startCrawler",
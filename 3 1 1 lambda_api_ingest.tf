@@ -1,11 +1,31 @@
 # /iac/lambda.tf invokes api_ingest.zip -> API_ingest.py: api response -> S3 forecast_raw bucket as facts&dimensions .json
+
+# Lambda package: handler plus the common/ modules it imports, rebuilt when any of them changes
+data "archive_file" "api_ingest" {
+  type        = "zip"
+  output_path = "${path.module}/build/api_ingest.zip"
+
+  source {
+    content  = file("${path.module}/lambda_api_ingest/api_ingest.py")
+    filename = "api_ingest.py"
+  }
+
+  dynamic "source" {
+    for_each = ["common/tracing.py", "common/codec.py", "common/dim_cache.py"]
+    content {
+      content  = file("${path.module}/${source.value}")
+      filename = basename(source.value)
+    }
+  }
+}
+
 resource "aws_lambda_function" "forecast_api_ingest" {
   function_name    = "forecast-api-ingest"
   handler          = "api_ingest.lambda_handler"
   runtime          = "python3.12"
   role             = aws_iam_role.lambda_role.arn
-  filename         = "api_ingest.zip"
-  source_code_hash = filebase64sha256("api_ingest.zip")
+  filename         = data.archive_file.api_ingest.output_path
+  source_code_hash = data.archive_file.api_ingest.output_base64sha256
   timeout          = 30
   layers = [
     "arn:aws:lambda:eu-north-1:770693421928:layer:Klayers-p312-requests:17"
@@ -16,6 +36,7 @@ resource "aws_lambda_function" "forecast_api_ingest" {
       latitude               = var.latitude
       longitude              = var.longitude
       S3_RAW_BUCKET          = aws_s3_bucket.forecast_raw.bucket
+      S3_CODEC               = var.s3_codec
     }
   }
 }
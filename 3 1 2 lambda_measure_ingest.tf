@@ -1,3 +1,22 @@
+# Lambda package: handler plus the common/ modules it imports, rebuilt when any of them changes
+data "archive_file" "measure_ingest" {
+  type        = "zip"
+  output_path = "${path.module}/build/measure_ingest.zip"
+
+  source {
+    content  = file("${path.module}/lambda_measure_ingest/measure_ingest.py")
+    filename = "measure_ingest.py"
+  }
+
+  dynamic "source" {
+    for_each = ["common/tracing.py", "common/codec.py", "common/schema.py"]
+    content {
+      content  = file("${path.module}/${source.value}")
+      filename = basename(source.value)
+    }
+  }
+}
+
 # --- Lambda Function Definition ---
 resource "aws_lambda_function" "measure_ingest" {
   function_name = "measure_ingest"
@@ -6,8 +25,8 @@ resource "aws_lambda_function" "measure_ingest" {
   runtime       = "python3.12"
   timeout       = 900
 
-  filename         = "${path.module}/measure_ingest.zip"
-  source_code_hash = filebase64sha256("${path.module}/measure_ingest.zip")
+  filename         = data.archive_file.measure_ingest.output_path
+  source_code_hash = data.archive_file.measure_ingest.output_base64sha256
   layers = [
     "arn:aws:lambda:eu-north-1:770693421928:layer:Klayers-p312-pandas:17"
   ]
@@ -16,6 +35,7 @@ resource "aws_lambda_function" "measure_ingest" {
     variables = {
       RAW_BUCKET = aws_s3_bucket.forecast_raw.bucket
       LOG_LEVEL  = "INFO"
+      S3_CODEC   = var.s3_codec
     }
   }
 }
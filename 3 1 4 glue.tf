@@ -8,6 +8,26 @@ resource "aws_s3_object" "glue_script" {
   etag   = filemd5("~/dwh_iac/scripts/forecast_etl.py") # only oploads file if the local file has diff checksum than existing one
 }
 
+# upload modules imported by forecast_etl.py (passed via --extra-py-files)
+locals {
+  glue_extra_modules = ["common/tracing.py", "common/codec.py", "common/schema.py", "scripts/rollups.py", "scripts/accuracy.py", "scripts/forecast_dedup.py", "scripts/time_dim_gen.py"]
+  # zstd objects need the zstandard package in the Glue jobs as well as in the Lambdas
+  glue_codec_modules = var.s3_codec == "zstd" ? { "--additional-python-modules" = "zstandard" } : {}
+}
+
+# Glue column definitions, generated from the schema registry in common/schema.py
+locals {
+  glue_columns = jsondecode(file("~/dwh_iac/common/glue_columns.json"))
+}
+
+resource "aws_s3_object" "glue_extra_modules" {
+  for_each = toset(local.glue_extra_modules)
+  bucket   = aws_s3_bucket.forecast_raw.bucket
+  key      = "scripts/lib/${basename(each.value)}"
+  source   = "~/dwh_iac/${each.value}"
+  etag     = filemd5("~/dwh_iac/${each.value}")
+}
+
 # Glue Job to execute forecast_etl.py
 resource "aws_glue_job" "forecast_etl" {
   name        = "forecast-etl-job"
@@ -17,10 +37,26 @@ resource "aws_glue_job" "forecast_etl" {
     script_location = "s3://${aws_s3_bucket.forecast_raw.bucket}/scripts/forecast_etl.py"
     python_version  = "3"
   }
-  default_arguments = {
-    "--job-language" = "python"
-    "--RAW_BUCKET"   = aws_s3_bucket.forecast_raw.bucket
-    "--PROC_BUCKET"  = aws_s3_bucket.forecast_processed.bucket
+  default_arguments = merge({
+    "--job-language"   = "python"
+    "--RAW_BUCKET"     = aws_s3_bucket.forecast_raw.bucket
+    "--PROC_BUCKET"    = aws_s3_bucket.forecast_processed.bucket
+    "--extra-py-files" = join(",", [for m in local.glue_extra_modules : "s3://${aws_s3_bucket.forecast_raw.bucket}/scripts/lib/${basename(m)}"])
+    # forecast_etl.py toggles (OPTIONAL_ARGS); Glue jobs take no environment variables
+    "--ETL_STREAMING"           = tostring(var.etl_streaming)
+    "--STREAM_BATCH_FILES"      = tostring(var.etl_stream_batch_files)
+    "--ETL_ROLLUPS"             = tostring(var.etl_rollups)
+    "--ETL_ACCURACY"            = tostring(var.etl_accuracy)
+    "--ACCURACY_LOCATION_MAP"   = jsonencode(var.etl_location_map)
+    "--SOLAR_KWH_PER_KWH_M2"    = tostring(var.etl_solar_kwh_per_kwh_m2)
+    "--ETL_FORECAST_DEDUP"      = tostring(var.etl_forecast_dedup)
+    "--FORECAST_HISTORY_ISSUES" = tostring(var.etl_forecast_history_issues)
+    "--S3_CODEC"                = var.s3_codec
+    "--TRACE_PROFILE"           = tostring(var.etl_trace_profile)
+  }, local.glue_codec_modules, var.etl_trace_profile ? { "--TRACE_PROFILE_BUCKET" = aws_s3_bucket.forecast_processed.bucket } : {})
+  # shard runs of RunETLBackfill (step_functions.tf) run side by side
+  execution_property {
+    max_concurrent_runs = var.etl_max_shards + 1
   }
   worker_type       = "G.1X"
   number_of_workers = 2
@@ -43,10 +79,12 @@ resource "aws_glue_job" "generate_time_dim" {
     script_location = "s3://${aws_s3_bucket.forecast_raw.bucket}/scripts/generate_time_dim.py"
     python_version  = "3"
   }
-  default_arguments = {
-    "--job-language" = "python"
-    "--PROC_BUCKET"  = aws_s3_bucket.forecast_processed.bucket
-  }
+  default_arguments = merge({
+    "--job-language"   = "python"
+    "--PROC_BUCKET"    = aws_s3_bucket.forecast_processed.bucket
+    "--extra-py-files" = join(",", [for m in ["scripts/time_dim_gen.py", "common/codec.py"] : "s3://${aws_s3_bucket.forecast_raw.bucket}/scripts/lib/${basename(m)}"])
+    "--S3_CODEC"       = var.s3_codec
+  }, local.glue_codec_modules)
   worker_type       = "G.1X"
   number_of_workers = 2
 }
@@ -73,8 +111,9 @@ resource "aws_glue_crawler" "forecast_proc_crawler" {
     path = "s3://forecast-processed-data-${random_string.suffix.result}/forecast_data/location_dim"
   }
 
+  # latest forecast per location and hour (forecast_dedup.py); per-run forecast_fact files are not crawled
   s3_target {
-    path = "s3://forecast-processed-data-${random_string.suffix.result}/forecast_data/forecast_fact"
+    path = "s3://forecast-processed-data-${random_string.suffix.result}/forecast_data/forecast_fact_latest"
   }
 
   s3_target {
@@ -104,6 +143,24 @@ resource "aws_glue_crawler" "forecast_proc_crawler" {
   s3_target {
     path = "s3://forecast-processed-data-${random_string.suffix.result}/measured_data/water_level_time_dim"
   }
+
+  # pre-aggregated rollups maintained by forecast_etl.py (partitioned by date / week_start)
+  s3_target {
+    path = "s3://forecast-processed-data-${random_string.suffix.result}/rollups/daily"
+  }
+
+  s3_target {
+    path = "s3://forecast-processed-data-${random_string.suffix.result}/rollups/weekly"
+  }
+
+  # forecast-vs-measured accuracy maintained by forecast_etl.py
+  s3_target {
+    path = "s3://forecast-processed-data-${random_string.suffix.result}/forecast_accuracy/detail"
+  }
+
+  s3_target {
+    path = "s3://forecast-processed-data-${random_string.suffix.result}/forecast_accuracy/by_lead"
+  }
 }
 
 
@@ -124,44 +181,14 @@ resource "aws_glue_catalog_table" "forecast_time_dim" {
       serialization_library = "org.openx.data.jsonserde.JsonSerDe"
     }
 
-    columns {
-      name = "forecast_time_id"
-      type = "bigint"
-    }
-
-    columns {
-      name = "date"
-      type = "date"
-    }
-
-    columns {
-      name = "hour"
-      type = "int"
-    }
-
-    columns {
-      name = "day"
-      type = "int"
-    }
-
-    columns {
-      name = "month"
-      type = "int"
-    }
-
-    columns {
-      name = "year"
-      type = "int"
-    }
-
-    columns {
-      name = "time_id"
-      type = "bigint"
-    }
-
-    columns {
-      name = "datetime"
-      type = "timestamp"
+    # columns from common/schema.py (python common/schema.py > common/glue_columns.json)
+    dynamic "columns" {
+      for_each = local.glue_columns["forecast_time_dim"]
+      content {
+        name    = columns.value.name
+        type    = columns.value.type
+        comment = lookup(columns.value, "comment", null)
+      }
     }
   }
   parameters = {
@@ -184,29 +211,14 @@ resource "aws_glue_catalog_table" "location_dim" {
       serialization_library = "org.openx.data.jsonserde.JsonSerDe"
     }
 
-    columns {
-      name = "location_id"
-      type = "bigint"
-    }
-
-    columns {
-      name = "city"
-      type = "string"
-    }
-
-    columns {
-      name = "country"
-      type = "string"
-    }
-
-    columns {
-      name = "latitude"
-      type = "double"
-    }
-
-    columns {
-      name = "longitude"
-      type = "double"
+    # columns from common/schema.py (python common/schema.py > common/glue_columns.json)
+    dynamic "columns" {
+      for_each = local.glue_columns["location_dim"]
+      content {
+        name    = columns.value.name
+        type    = columns.value.type
+        comment = lookup(columns.value, "comment", null)
+      }
     }
   }
 
@@ -230,44 +242,14 @@ resource "aws_glue_catalog_table" "download_time_dim" {
       serialization_library = "org.openx.data.jsonserde.JsonSerDe"
     }
 
-    columns {
-      name = "download_time_id"
-      type = "bigint"
-    }
-
-    columns {
-      name = "timestamp"
-      type = "timestamp" # could also be 'timestamp' if you write ISO timestamps
-    }
-
-    columns {
-      name = "hour"
-      type = "int"
-    }
-
-    columns {
-      name = "day"
-      type = "int"
-    }
-
-    columns {
-      name = "month"
-      type = "int"
-    }
-
-    columns {
-      name = "year"
-      type = "int"
-    }
-
-    columns {
-      name = "time_id"
-      type = "bigint"
-    }
-
-    columns {
-      name = "datetime"
-      type = "timestamp"
+    # columns from common/schema.py (python common/schema.py > common/glue_columns.json)
+    dynamic "columns" {
+      for_each = local.glue_columns["download_time_dim"]
+      content {
+        name    = columns.value.name
+        type    = columns.value.type
+        comment = lookup(columns.value, "comment", null)
+      }
     }
   }
   parameters = {
@@ -291,54 +273,14 @@ resource "aws_glue_catalog_table" "forecast_fact" {
       serialization_library = "org.openx.data.jsonserde.JsonSerDe"
     }
 
-    columns {
-      name = "forecast_id"
-      type = "string"
-    }
-
-    columns {
-      name = "location_id"
-      type = "bigint"
-    }
-
-    columns {
-      name = "time_id"
-      type = "bigint"
-    }
-
-    columns {
-      name = "temperature_c"
-      type = "double"
-    }
-
-    columns {
-      name = "rain_mm"
-      type = "double"
-    }
-
-    columns {
-      name = "solarradiation_w"
-      type = "double"
-    }
-
-    columns {
-      name = "cloudcover"
-      type = "int"
-    }
-
-    columns {
-      name = "wind_speed_kmh"
-      type = "double"
-    }
-
-    columns {
-      name = "humidity"
-      type = "double"
-    }
-
-    columns {
-      name = "weather_condition"
-      type = "string"
+    # columns from common/schema.py (python common/schema.py > common/glue_columns.json)
+    dynamic "columns" {
+      for_each = local.glue_columns["forecast_fact"]
+      content {
+        name    = columns.value.name
+        type    = columns.value.type
+        comment = lookup(columns.value, "comment", null)
+      }
     }
   }
 
@@ -362,43 +304,14 @@ resource "aws_glue_catalog_table" "solar_energy_time_dim" {
       name                  = "solar_energy_time_dim"
       serialization_library = "org.openx.data.jsonserde.JsonSerDe"
     }
-    columns {
-      name = "solar_energy_time_id"
-      type = "bigint"
-    }
-
-    columns {
-      name = "date"
-      type = "date"
-    }
-
-    columns {
-      name = "hour"
-      type = "int"
-    }
-
-    columns {
-      name = "day"
-      type = "int"
-    }
-
-    columns {
-      name = "month"
-      type = "int"
-    }
-
-    columns {
-      name = "year"
-      type = "int"
-    }
-    columns {
-      name = "time_id"
-      type = "string"
-    }
-
-    columns {
-      name = "datetime"
-      type = "timestamp"
+    # columns from common/schema.py (python common/schema.py > common/glue_columns.json)
+    dynamic "columns" {
+      for_each = local.glue_columns["solar_time_dim"]
+      content {
+        name    = columns.value.name
+        type    = columns.value.type
+        comment = lookup(columns.value, "comment", null)
+      }
     }
   }
 }
@@ -422,31 +335,14 @@ resource "aws_glue_catalog_table" "solar_energy_fact" {
       serialization_library = "org.openx.data.jsonserde.JsonSerDe"
     }
 
-    columns {
-      name = "energy_id"
-      type = "bigint"
-    }
-
-    columns {
-      name    = "location_id"
-      type    = "bigint"
-      comment = "FK to locations_dim.location_id"
-    }
-
-    columns {
-      name    = "energy_time_id"
-      type    = "bigint"
-      comment = "FK to solar_energy_time_dim.solar_energy_time_id"
-    }
-
-    columns {
-      name = "solarenergy_kwh"
-      type = "decimal(10,2)"
-    }
-
-    columns {
-      name = "date_uploaded"
-      type = "date"
+    # columns from common/schema.py (python common/schema.py > common/glue_columns.json)
+    dynamic "columns" {
+      for_each = local.glue_columns["solar_fact"]
+      content {
+        name    = columns.value.name
+        type    = columns.value.type
+        comment = lookup(columns.value, "comment", null)
+      }
     }
   }
 }
@@ -470,44 +366,14 @@ resource "aws_glue_catalog_table" "water_level_time_dim" {
       serialization_library = "org.openx.data.jsonserde.JsonSerDe"
     }
 
-    columns {
-      name = "water_level_time_id"
-      type = "bigint"
-    }
-
-    columns {
-      name = "date"
-      type = "date"
-    }
-
-    columns {
-      name = "hour"
-      type = "int"
-    }
-
-    columns {
-      name = "day"
-      type = "int"
-    }
-
-    columns {
-      name = "month"
-      type = "int"
-    }
-
-    columns {
-      name = "year"
-      type = "int"
-    }
-
-    columns {
-      name = "time_id"
-      type = "bigint"
-    }
-
-    columns {
-      name = "datetime"
-      type = "timestamp"
+    # columns from common/schema.py (python common/schema.py > common/glue_columns.json)
+    dynamic "columns" {
+      for_each = local.glue_columns["water_level_time_dim"]
+      content {
+        name    = columns.value.name
+        type    = columns.value.type
+        comment = lookup(columns.value, "comment", null)
+      }
     }
   }
 }
@@ -531,36 +397,14 @@ resource "aws_glue_catalog_table" "water_level_fact" {
       serialization_library = "org.openx.data.jsonserde.JsonSerDe"
     }
 
-    columns {
-      name = "water_level_id"
-      type = "bigint"
-    }
-
-    columns {
-      name    = "location_id"
-      type    = "bigint"
-      comment = "FK to locations_dim.location_id"
-    }
-
-    columns {
-      name    = "level_time_id"
-      type    = "bigint"
-      comment = "FK to water_level_time_dim.water_level_time_id"
-    }
-
-    columns {
-      name = "water_level_mm"
-      type = "bigint"
-    }
-
-    columns {
-      name = "rain_collected_mm"
-      type = "bigint"
-    }
-
-    columns {
-      name = "date_uploaded"
-      type = "date"
+    # columns from common/schema.py (python common/schema.py > common/glue_columns.json)
+    dynamic "columns" {
+      for_each = local.glue_columns["water_level_fact"]
+      content {
+        name    = columns.value.name
+        type    = columns.value.type
+        comment = lookup(columns.value, "comment", null)
+      }
     }
   }
 }
@@ -579,52 +423,14 @@ resource "aws_glue_catalog_table" "time_dim" {
   table_type    = "EXTERNAL_TABLE"
 
   storage_descriptor {
-    # -------------------------------
-    # Columns definition
-    # -------------------------------
-    columns {
-      name = "time_id" # unique time identifier (e.g., 2025102913)
-      type = "bigint"
-    }
-
-    columns {
-      name = "datetime" # full timestamp (UTC)
-      type = "timestamp"
-    }
-
-    columns {
-      name = "date" # date portion of timestamp
-      type = "date"
-    }
-
-    columns {
-      name = "hour" # hour of the day (0–23)
-      type = "int"
-    }
-
-    columns {
-      name = "day" # day of the month (1–31)
-      type = "int"
-    }
-
-    columns {
-      name = "month" # month number (1–12)
-      type = "int"
-    }
-
-    columns {
-      name = "year" # 4-digit year
-      type = "int"
-    }
-
-    columns {
-      name = "weekday_name" # name of the weekday (e.g., Monday)
-      type = "string"
-    }
-
-    columns {
-      name = "is_weekend" # boolean flag for weekend
-      type = "boolean"
+    # columns from common/schema.py (python common/schema.py > common/glue_columns.json)
+    dynamic "columns" {
+      for_each = local.glue_columns["time_dim"]
+      content {
+        name    = columns.value.name
+        type    = columns.value.type
+        comment = lookup(columns.value, "comment", null)
+      }
     }
 
     # -------------------------------
@@ -675,7 +481,9 @@ resource "aws_iam_role_policy" "glue_policy" {
         Action = [
           "s3:GetObject",
           "s3:PutObject",
-          "s3:ListBucket"
+          "s3:ListBucket",
+          "s3:AbortMultipartUpload", # streaming mode in forecast_etl.py
+          "s3:DeleteObject"          # staged run state; copies of time_dim/indexes under a previous S3_CODEC
         ]
         Resource = [
           "arn:aws:s3:::forecast-raw-data-${random_string.suffix.result}",
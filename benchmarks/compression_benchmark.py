@@ -0,0 +1,102 @@
+# /benchmarks/compression_benchmark.py: compression ratio and throughput of the common/codec.py codecs
+#
+# Measures every available codec on the object shapes the pipeline writes: raw API responses,
+# single-record raw facts/dims, processed NDJSON outputs and sensor CSVs (synthetic, see datagen.py).
+#
+#   python benchmarks/compression_benchmark.py
+#   S3_ZSTD_LEVEL=9 python benchmarks/compression_benchmark.py --days 60 --repeat 5
+import argparse
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [BENCH_DIR, os.path.join(REPO_DIR, "common")]
+
+import codec  # noqa: E402
+import datagen  # noqa: E402
+
+
+def samples(args):
+    """name -> list of object bodies, shaped like what the writers upload."""
+    payload = datagen.forecast_payload(args.seed, args.days)
+    facts = []
+    for day in payload["days"]:
+        for hour in day["hours"]:
+            facts.append({
+                "forecast_id": f"123456_{len(facts)}_bench-request",
+                "location_id": 123456,
+                "time_id": len(facts),
+                "temperature_c": float(hour["temp"]),
+                "rain_mm": float(hour["precip"]),
+                "solarradiation_w": float(hour["solarradiation"]),
+                "cloudcover": int(hour["cloudcover"]),
+                "wind_speed_kmh": float(hour["windspeed"]),
+                "humidity": float(hour["humidity"]),
+                "weather_condition": hour["conditions"],
+            })
+    return {
+        "api response": [json.dumps(payload, sort_keys=True).encode("utf-8")],
+        "raw fact (1 row)": [json.dumps(f, sort_keys=True).encode("utf-8") for f in facts],
+        "processed ndjson": ["\n".join(json.dumps(f) for f in facts * args.ndjson_copies).encode("utf-8")],
+        "sensor csv": [
+            datagen.solar_csv(args.seed, args.csv_rows).encode("utf-8"),
+            datagen.rainfall_csv(args.seed, args.csv_rows).encode("utf-8"),
+        ],
+    }
+
+
+def measure(bodies, name, repeat):
+    raw = sum(len(b) for b in bodies)
+    best_c = best_d = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        compressed = [codec.compress(b, name) for b in bodies]
+        best_c = min(best_c, time.perf_counter() - start)
+        start = time.perf_counter()
+        for c in compressed:
+            codec.decompress(c, name)
+        best_d = min(best_d, time.perf_counter() - start)
+    stored = sum(len(c) for c in compressed)
+    mb = raw / 1024 / 1024
+    return {
+        "objects": len(bodies),
+        "raw_bytes": raw,
+        "stored_bytes": stored,
+        "ratio": round(raw / stored, 2) if stored else 0.0,
+        "compress_mb_s": round(mb / best_c, 1) if best_c else 0.0,
+        "decompress_mb_s": round(mb / best_d, 1) if best_d else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compression ratio and throughput per codec and object shape")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--days", type=int, default=15, help="forecast days in the synthetic API response")
+    parser.add_argument("--csv-rows", type=int, default=2000, help="rows per sensor CSV")
+    parser.add_argument("--ndjson-copies", type=int, default=20, help="repeats of the fact rows in the processed NDJSON sample")
+    parser.add_argument("--repeat", type=int, default=3, help="timing repeats (best is reported)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    codecs = ["none", "gzip"] + (["zstd"] if codec.zstandard is not None else [])
+    results = {}
+    for shape, bodies in samples(args).items():
+        for name in codecs:
+            results[f"{shape} / {name}"] = measure(bodies, name, args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    if codec.zstandard is None:
+        print("zstandard not installed; zstd skipped")
+    print(f"{'sample / codec':<30}{'objects':>9}{'raw KB':>10}{'stored KB':>11}{'ratio':>8}{'comp MB/s':>11}{'decomp MB/s':>13}")
+    for label, r in results.items():
+        print(f"{label:<30}{r['objects']:>9}{r['raw_bytes'] / 1024:>10.1f}{r['stored_bytes'] / 1024:>11.1f}"
+              f"{r['ratio']:>8}{r['compress_mb_s']:>11}{r['decompress_mb_s']:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# /benchmarks/datagen.py: seeded synthetic data for the benchmark suite (Visual Crossing payloads and sensor CSVs)
+import json
+import random
+from datetime import date, timedelta
+
+CONDITIONS = ["Clear", "Partially cloudy", "Overcast", "Rain", "Rain, Overcast", "Rain, Partially cloudy"]
+
+
+def forecast_payload(seed: int, days: int, start: date = date(2025, 1, 1)) -> dict:
+    """Visual Crossing timeline response with `days` days of 24 hourly forecasts."""
+    rng = random.Random(seed)
+    payload_days = []
+    for d in range(days):
+        day_str = (start + timedelta(days=d)).strftime("%Y-%m-%d")
+        hours = []
+        for h in range(24):
+            solar = max(0.0, 900.0 * (1 - abs(h - 12) / 7)) * rng.uniform(0.4, 1.0)
+            hours.append({
+                "datetime": f"{h:02d}:00:00",
+                "temp": round(rng.uniform(21.0, 34.0), 1),
+                "precip": round(rng.choice([0.0, 0.0, 0.0, rng.uniform(0.1, 12.0)]), 2),
+                "solarradiation": round(solar, 1),
+                "cloudcover": rng.randint(0, 100),
+                "windspeed": round(rng.uniform(0.0, 25.0), 1),
+                "humidity": round(rng.uniform(40.0, 95.0), 1),
+                "conditions": rng.choice(CONDITIONS),
+            })
+        payload_days.append({"datetime": day_str, "hours": hours})
+    return {
+        "latitude": 6.6,
+        "longitude": -1.6,
+        "resolvedAddress": "Samsamso Ecofarm",
+        "timezone": "Africa/Accra",
+        "days": payload_days,
+    }
+
+
+def solar_csv(seed: int, rows: int, start: date = date(2025, 1, 1)) -> str:
+    """Hourly solar measurement CSV in the layout of uploads/csv/solar/."""
+    rng = random.Random(seed)
+    lines = ["date,hour,solarenergy_kwh,solarenergy_kwh_sum_day,location_id"]
+    day_sum = 0.0
+    for i in range(rows):
+        day, hour = divmod(i, 24)
+        if hour == 0:
+            day_sum = 0.0
+        kwh = round(max(0.0, 1.2 * (1 - abs(hour - 12) / 7)) * rng.uniform(0.3, 1.0), 2)
+        day_sum += kwh
+        lines.append(f"{(start + timedelta(days=day)).strftime('%Y-%m-%d')},{hour},{kwh},{round(day_sum, 2)},1")
+    return "\n".join(lines) + "\n"
+
+
+def rainfall_csv(seed: int, rows: int, start: date = date(2025, 1, 1)) -> str:
+    """Hourly rainfall/water level CSV in the layout of uploads/csv/rainfall/."""
+    rng = random.Random(seed)
+    lines = ["date,hour,water_level_mm,rain_collected_mm,location_id"]
+    level = 500
+    for i in range(rows):
+        day, hour = divmod(i, 24)
+        rain = rng.choice([0, 0, 0, 0, rng.randint(1, 15)])
+        level = max(0, level + rain - rng.randint(0, 3))
+        lines.append(f"{(start + timedelta(days=day)).strftime('%Y-%m-%d')},{hour},{level},{rain},1")
+    return "\n".join(lines) + "\n"
+
+
+def seed_raw_bucket(s3, bucket: str, seed: int, hist_files: int, hist_days: int, csv_rows: int):
+    """Upload historical forecast files and sensor CSVs that the ingest lambdas pick up."""
+    bodies = {
+        f"uploads/hist/hist_{i:04d}.json": json.dumps(
+            forecast_payload(seed + i, hist_days, start=date(2025, 1, 1) + timedelta(days=i * hist_days))
+        ).encode("utf-8")
+        for i in range(hist_files)
+    }
+    # json_ingest keys download_time_dim by the LastModified second: upload until every file shares
+    # one, so each run has the same dimension rows (and S3 calls; see run_benchmarks.run_stage)
+    while bodies:
+        for key, body in bodies.items():
+            s3.put_object(Bucket=bucket, Key=key, Body=body)
+        objects = s3.list_objects_v2(Bucket=bucket, Prefix="uploads/hist/").get("Contents", [])
+        if len({o["LastModified"].strftime("%Y%m%d%H%M%S") for o in objects}) <= 1:
+            break
+    s3.put_object(Bucket=bucket, Key="uploads/csv/solar/solar.csv", Body=solar_csv(seed, csv_rows).encode("utf-8"))
+    s3.put_object(Bucket=bucket, Key="uploads/csv/rainfall/rainfall.csv", Body=rainfall_csv(seed, csv_rows).encode("utf-8"))
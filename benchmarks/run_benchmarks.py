@@ -0,0 +1,325 @@
+# /benchmarks/run_benchmarks.py: end-to-end throughput benchmark for the ingest lambdas and forecast_etl
+#
+# Runs api_ingest -> json_ingest -> measure_ingest -> forecast_etl against a local moto
+# S3/CloudWatch server with a stubbed Visual Crossing endpoint, and reports records/s,
+# S3 calls and peak memory per stage. Regressions against baseline.json fail the run.
+#
+# Wall-clock records/s on a shared machine drifts by 20% between runs, so the pipeline runs
+# --repeat times (fresh stand-in each) and every stage reports its fastest run. Records and S3
+# calls do not depend on timing and are gated exactly.
+#
+#   pip install "moto[server]" pandas boto3 requests
+#   python benchmarks/run_benchmarks.py                    # compare against baseline.json
+#   python benchmarks/run_benchmarks.py --update-baseline  # store new baseline
+import argparse
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import urllib.request
+from collections import Counter
+from unittest import mock
+
+import boto3
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [BENCH_DIR, os.path.join(REPO_DIR, "common")]
+
+import codec  # noqa: E402
+import datagen  # noqa: E402
+
+RAW_BUCKET = "bench-raw"
+PROC_BUCKET = "bench-proc"
+STAGES = ["api_ingest", "json_ingest", "measure_ingest", "forecast_etl"]
+STAGE_PATHS = {
+    "api_ingest": "lambda_api_ingest",
+    "json_ingest": "lambda_JSON_ingest",
+    "measure_ingest": "lambda_measure_ingest",
+    "forecast_etl": "scripts",
+}
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+
+# ---------- Local AWS stand-in ----------
+class CallCounter:
+    """WSGI middleware counting requests per AWS service (read from the SigV4 credential scope)."""
+
+    def __init__(self, app):
+        self.app = app
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        auth = environ.get("HTTP_AUTHORIZATION", "")
+        service = "unknown"
+        if "Credential=" in auth:
+            # Credential=<key>/<date>/<region>/<service>/aws4_request
+            scope = auth.split("Credential=", 1)[1].split(",", 1)[0].split("/")
+            if len(scope) >= 4:
+                service = scope[3]
+        with self.lock:
+            self.counts[service] += 1
+        return self.app(environ, start_response)
+
+    def snapshot(self):
+        with self.lock:
+            return Counter(self.counts)
+
+
+def start_aws_standin():
+    """Start moto in a background thread; returns (endpoint_url, counter, server)."""
+    from moto.moto_server.werkzeug_app import DomainDispatcherApplication, create_backend_app
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    counter = CallCounter(DomainDispatcherApplication(create_backend_app))
+    server = make_server("127.0.0.1", 0, counter, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{server.server_port}"
+    # moto backends live in this process: drop the buckets of an earlier run
+    urllib.request.urlopen(urllib.request.Request(f"{endpoint}/moto-api/reset", method="POST")).close()
+    return endpoint, counter, server
+
+
+def aws_env(endpoint):
+    env = os.environ.copy()
+    env.update({
+        "AWS_ENDPOINT_URL": endpoint,
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+        "AWS_DEFAULT_REGION": "eu-north-1",
+        "DIM_CACHE_DIR": tempfile.mkdtemp(prefix="bench_dim_cache_"),  # cold containers, no cache from earlier runs
+        "S3_RAW_BUCKET": RAW_BUCKET,
+        "RAW_BUCKET": RAW_BUCKET,
+        "latitude": "6.6",
+        "longitude": "-1.6",
+        "VISUALCROSSING_API_KEY": "bench",
+    })
+    return env
+
+
+# ---------- Stage runners (executed in a child process each) ----------
+class FakeContext:
+    aws_request_id = "bench-request"
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, payload):
+        self._payload = payload
+        self.text = json.dumps(payload)
+        self.content = self.text.encode("utf-8")
+
+    def json(self):
+        return self._payload
+
+
+def ingested_count(result):
+    """Parse 'Successfully ingested N forecast records' from a lambda response."""
+    message = json.loads(result["body"]).get("message", "")
+    return int(message.split("ingested ")[1].split(" ")[0]) if "ingested " in message else 0
+
+
+def run_stage(stage, args):
+    sys.path[:0] = [os.path.join(REPO_DIR, STAGE_PATHS[stage]), os.path.join(REPO_DIR, "common")]
+    logging.disable(logging.INFO)
+
+    if stage == "api_ingest":
+        import api_ingest
+        payload = datagen.forecast_payload(args.seed, args.days)
+        # download_time_dim ids are per second: start on a fresh one, so this download never shares the
+        # seeded history's second (datagen keeps that in one) and every run has the same dimension rows
+        time.sleep(1.05 - time.time() % 1)
+        with mock.patch.object(api_ingest.requests, "get", return_value=FakeResponse(payload)):
+            start = time.perf_counter()
+            records = ingested_count(api_ingest.lambda_handler({}, FakeContext()))
+    elif stage == "json_ingest":
+        import json_ingest
+        start = time.perf_counter()
+        records = ingested_count(json_ingest.lambda_handler({}, FakeContext()))
+    elif stage == "measure_ingest":
+        import measure_ingest
+        start = time.perf_counter()
+        measure_ingest.lambda_handler({}, FakeContext())
+        records = None  # counted by the parent from the measured_data outputs
+    else:
+        # Glue runtime stand-in: only getResolvedOptions is used
+        glue_utils = types.ModuleType("awsglue.utils")
+        glue_utils.getResolvedOptions = lambda argv, names: {n: argv[argv.index(f"--{n}") + 1] for n in names}
+        sys.modules["awsglue"] = types.ModuleType("awsglue")
+        sys.modules["awsglue.utils"] = glue_utils
+        sys.argv = [sys.argv[0], "--RAW_BUCKET", RAW_BUCKET, "--PROC_BUCKET", PROC_BUCKET]
+        import forecast_etl
+        start = time.perf_counter()
+        forecast_etl.run_etl()
+        records = None  # counted by the parent from the processed outputs
+    seconds = time.perf_counter() - start
+
+    peak_kb = max(own_peak_kb(), resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    print(json.dumps({"records": records, "seconds": seconds, "peak_mb": round(peak_kb / 1024, 1)}))
+
+
+def own_peak_kb():
+    """Peak RSS of this process. Linux keeps the forking parent's ru_maxrss across exec, so VmHWM is read where available."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# ---------- Orchestration ----------
+# Per-prefix outputs of forecast_etl; rollups, accuracy, forecast_fact_latest and indexes are not ETL records
+ETL_OUTPUT_PREFIXES = [
+    "forecast_data/download_time_dim/", "forecast_data/forecast_fact/", "forecast_data/forecast_time_dim/",
+    "forecast_data/location_dim/", "measured_data/solar_fact/", "measured_data/solar_time_dim/",
+    "measured_data/water_level_fact/", "measured_data/water_level_time_dim/",
+]
+# Fact rows measure_ingest writes to the raw bucket, one per CSV row
+MEASURE_OUTPUT_PREFIXES = ["measured_data/solar_fact/", "measured_data/water_level_fact/"]
+# stage -> (bucket, prefixes) whose records the parent counts after the stage ran
+STAGE_OUTPUTS = {
+    "measure_ingest": (RAW_BUCKET, MEASURE_OUTPUT_PREFIXES),
+    "forecast_etl": (PROC_BUCKET, ETL_OUTPUT_PREFIXES),
+}
+
+
+def count_records(s3, bucket, prefixes):
+    """NDJSON records in the objects under prefixes (a last line without newline counts too)."""
+    records = 0
+    paginator = s3.get_paginator("list_objects_v2")
+    for prefix in prefixes:
+        for obj in (o for page in paginator.paginate(Bucket=bucket, Prefix=prefix) for o in page.get("Contents", [])):
+            key = obj["Key"]
+            body = codec.read_body(s3.get_object(Bucket=bucket, Key=key), key)
+            records += body.count(b"\n") + (0 if body.endswith(b"\n") or not body else 1)
+    return records
+
+
+def run_all(args):
+    endpoint, counter, server = start_aws_standin()
+    env = aws_env(endpoint)
+    s3 = boto3.client(
+        "s3", endpoint_url=endpoint, region_name="eu-north-1",
+        aws_access_key_id="bench", aws_secret_access_key="bench",
+    )
+    for bucket in (RAW_BUCKET, PROC_BUCKET):
+        s3.create_bucket(Bucket=bucket, CreateBucketConfiguration={"LocationConstraint": "eu-north-1"})
+    datagen.seed_raw_bucket(s3, RAW_BUCKET, args.seed, args.hist_files, args.hist_days, args.csv_rows)
+
+    results = {}
+    for stage in STAGES:
+        before = counter.snapshot()
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--stage", stage, *child_args(args)],
+            env=env, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            sys.stderr.write(proc.stderr)
+            raise SystemExit(f"Stage {stage} failed")
+        calls = counter.snapshot() - before
+        stats = json.loads(proc.stdout.strip().splitlines()[-1])
+        if stats["records"] is None:
+            stats["records"] = count_records(s3, *STAGE_OUTPUTS[stage])
+        results[stage] = {
+            "records": stats["records"],
+            "seconds": round(stats["seconds"], 3),
+            "records_per_s": round(stats["records"] / stats["seconds"], 1) if stats["seconds"] else 0.0,
+            "s3_calls": calls.get("s3", 0),
+            "cloudwatch_calls": calls.get("monitoring", 0),
+            "peak_mb": stats["peak_mb"],
+        }
+    server.shutdown()
+    return results
+
+
+def best_of(runs):
+    """Per stage, the run with the fewest seconds (wall-clock noise only ever adds time)."""
+    return {stage: min((run[stage] for run in runs), key=lambda r: r["seconds"]) for stage in runs[0]}
+
+
+def child_args(args):
+    return [
+        "--seed", str(args.seed), "--days", str(args.days), "--hist-files", str(args.hist_files),
+        "--hist-days", str(args.hist_days), "--csv-rows", str(args.csv_rows),
+    ]
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regression messages against the stored baseline."""
+    regressions = []
+    for stage, current in results.items():
+        base = baseline.get(stage)
+        if not base:
+            continue
+        if current["records"] < base["records"]:
+            regressions.append(f"{stage}: records {current['records']} < baseline {base['records']}")
+        if current["records_per_s"] < base["records_per_s"] * (1 - tolerance):
+            regressions.append(f"{stage}: records/s {current['records_per_s']} < baseline {base['records_per_s']}")
+        if current["s3_calls"] > base["s3_calls"]:
+            regressions.append(f"{stage}: S3 calls {current['s3_calls']} > baseline {base['s3_calls']}")
+        if current["peak_mb"] > base["peak_mb"] * (1 + tolerance):
+            regressions.append(f"{stage}: peak memory {current['peak_mb']} MB > baseline {base['peak_mb']} MB")
+    return regressions
+
+
+def print_report(results):
+    print(f"{'stage':<16}{'records':>10}{'seconds':>10}{'records/s':>12}{'s3 calls':>10}{'cw calls':>10}{'peak MB':>10}")
+    for stage, r in results.items():
+        print(f"{stage:<16}{r['records']:>10}{r['seconds']:>10}{r['records_per_s']:>12}"
+              f"{r['s3_calls']:>10}{r['cloudwatch_calls']:>10}{r['peak_mb']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end ingest and ETL benchmark against a local AWS stand-in")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--days", type=int, default=15, help="forecast days in the stubbed API response")
+    parser.add_argument("--hist-files", type=int, default=5, help="historical forecast files in uploads/hist/")
+    parser.add_argument("--hist-days", type=int, default=15, help="days per historical forecast file")
+    parser.add_argument("--csv-rows", type=int, default=2000, help="rows per sensor CSV")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative throughput/memory drift")
+    parser.add_argument("--repeat", type=int, default=3, help="pipeline runs; each stage reports its fastest")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--stage", choices=STAGES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        run_stage(args.stage, args)
+        return
+
+    results = best_of([run_all(args) for _ in range(max(1, args.repeat))])
+    print_report(results)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --update-baseline to create one.")
+        return
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# /benchmarks/schema_memory.py: in-memory size of processed frames with and without the common/schema.py dtypes
+#
+# Builds synthetic rows per table (see datagen.py), parses them the way forecast_etl.py does, and
+# compares the frame as the old per-file casts left it (int64/float64/Python strings, Int64 time
+# parts) with schema.apply(). Sizes are deep memory_usage, scaled to one million rows.
+#
+#   python benchmarks/schema_memory.py
+#   python benchmarks/schema_memory.py --rows 500000 --json
+import argparse
+import json
+import os
+import sys
+from datetime import date, datetime, timedelta
+from io import StringIO
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [BENCH_DIR, os.path.join(REPO_DIR, "common"), os.path.join(REPO_DIR, "scripts")]
+
+import pandas as pd  # noqa: E402
+
+import datagen  # noqa: E402
+import schema  # noqa: E402
+import time_dim_gen  # noqa: E402
+
+
+def forecast_rows(seed, rows):
+    """forecast_fact and forecast_time_dim records as json_ingest.py writes them."""
+    payload = datagen.forecast_payload(seed, rows // 24 + 1)
+    facts, times = [], []
+    for day in payload["days"]:
+        d = datetime.strptime(day["datetime"], "%Y-%m-%d")
+        for hour in day["hours"]:
+            h = int(hour["datetime"][:2])
+            time_id = d.year * 1000000 + d.month * 10000 + d.day * 100 + h
+            facts.append({
+                "forecast_id": f"123456_{time_id}_bench-request-{len(facts)}",
+                "location_id": 123456,
+                "time_id": time_id,
+                "temperature_c": float(hour["temp"]),
+                "rain_mm": float(hour["precip"]),
+                "solarradiation_w": float(hour["solarradiation"]),
+                "cloudcover": int(hour["cloudcover"]),
+                "wind_speed_kmh": float(hour["windspeed"]),
+                "humidity": float(hour["humidity"]),
+                "weather_condition": hour["conditions"],
+                "issued_at": "2025-01-01T06:00:00+00:00",
+            })
+            times.append({
+                "forecast_time_id": time_id, "date": f"{day['datetime']}T{h:02d}:00:00Z",
+                "hour": h, "day": d.day, "month": d.month, "year": d.year,
+            })
+    return facts[:rows], times[:rows]
+
+
+def measured_rows(seed, rows):
+    """solar_fact, water_level_fact and solar_time_dim records as measure_ingest.py writes them."""
+    solar = pd.read_csv(StringIO(datagen.solar_csv(seed, rows)))
+    rain = pd.read_csv(StringIO(datagen.rainfall_csv(seed, rows)))
+    uploaded = "2025-06-01 12:00:00"
+    solar_facts = [
+        {"energy_id": i, "location_id": 1, "energy_time_id": i, "solarenergy_kwh": kwh,
+         "date_uploaded": uploaded, "solarenergy_kwh_sum_day": total}
+        for i, (kwh, total) in enumerate(zip(solar["solarenergy_kwh"], solar["solarenergy_kwh_sum_day"]))
+    ]
+    water_facts = [
+        {"water_level_id": i, "location_id": 1, "level_time_id": i, "water_level_mm": int(level),
+         "rain_collected_mm": int(mm), "date_uploaded": uploaded}
+        for i, (level, mm) in enumerate(zip(rain["water_level_mm"], rain["rain_collected_mm"]))
+    ]
+    times = []
+    for i, (day, hour) in enumerate(zip(solar["date"], solar["hour"])):
+        d = datetime.strptime(day, "%Y-%m-%d")
+        times.append({"solar_energy_time_id": i, "date": day, "hour": int(hour),
+                      "day": d.day, "month": d.month, "year": d.year})
+    return solar_facts, water_facts, times
+
+
+def parse(records):
+    """NDJSON -> frame, as forecast_etl.parse_json_body reads raw objects."""
+    return pd.read_json(StringIO("\n".join(json.dumps(r) for r in records)), lines=True)
+
+
+def old_casts(df):
+    """The casts forecast_etl.transform_file applied before the schema registry."""
+    for col in ["time_id", "year", "month", "day", "hour"]:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
+    if "is_weekend" in df.columns:
+        df["is_weekend"] = df["is_weekend"].astype(bool)
+    if "datetime" in df.columns:
+        df["datetime"] = pd.to_datetime(df["datetime"], errors="coerce", utc=True)
+    return df
+
+
+def add_time_id(df):
+    if {"year", "month", "day", "hour"} <= set(df.columns):
+        df["time_id"] = df["year"] * 1000000 + df["month"] * 10000 + df["day"] * 100 + df["hour"]
+    return df
+
+
+def samples(args):
+    """table -> records."""
+    facts, forecast_times = forecast_rows(args.seed, args.rows)
+    solar_facts, water_facts, solar_times = measured_rows(args.seed, args.rows)
+    start = pd.Timestamp(date(2024, 1, 1))
+    time_dim = time_dim_gen.build_time_dim(start, start + timedelta(hours=args.rows - 1))
+    return {
+        "forecast_fact": facts,
+        "forecast_time_dim": forecast_times,
+        "solar_fact": solar_facts,
+        "water_level_fact": water_facts,
+        "solar_time_dim": solar_times,
+        "time_dim": json.loads(time_dim.to_json(orient="records", date_format="iso")),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory per million rows with and without the schema registry dtypes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rows", type=int, default=200000, help="synthetic rows per table (results are scaled to 1M)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for table, records in samples(args).items():
+        before = old_casts(add_time_id(parse(records)))
+        after = schema.apply(add_time_id(parse(records)), table)
+        scale = 1_000_000 / len(records)
+        old_mb = before.memory_usage(deep=True).sum() * scale / 1024 / 1024
+        new_mb = after.memory_usage(deep=True).sum() * scale / 1024 / 1024
+        results[table] = {
+            "rows": len(records),
+            "mb_per_million_before": round(old_mb, 1),
+            "mb_per_million_after": round(new_mb, 1),
+            "mb_saved_per_million": round(old_mb - new_mb, 1),
+            "saved_pct": round(100 * (1 - new_mb / old_mb), 1) if old_mb else 0.0,
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"pandas {pd.__version__}; MB per 1M rows (deep)")
+    print(f"{'table':<22}{'before':>10}{'after':>10}{'saved':>10}{'saved %':>10}")
+    for table, r in results.items():
+        print(f"{table:<22}{r['mb_per_million_before']:>10}{r['mb_per_million_after']:>10}"
+              f"{r['mb_saved_per_million']:>10}{r['saved_pct']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# /common/codec.py: transparent gzip/zstd compression for raw and processed S3 objects
+#
+# Usage:
+#   key = codec.put_object(s3, bucket, "forecast_data/forecast_fact/x.json", body)   # -> ".../x.json.gz"
+#   body = codec.read_body(s3.get_object(Bucket=bucket, Key=key), key)               # bytes, decompressed
+#   df = pd.read_csv(codec.open_body(obj, key))                                      # streaming reader
+#
+# S3_CODEC selects what writers use: "gzip" (default), "zstd" (needs the zstandard package
+# in the Lambda layer / Glue --additional-python-modules) or "none". Objects get the codec's
+# key suffix and a matching Content-Encoding, so Glue crawlers and Athena read them as-is.
+# Readers decide from Content-Encoding or the key suffix, so plain and compressed objects
+# can sit side by side under one prefix. Objects rewritten in place under a fixed key (time_dim,
+# indexes) are written with replace_object(), which removes the copies under other codecs, so a
+# crawled folder never holds two versions of one table.
+import gzip
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional; only needed when S3_CODEC=zstd or zstd objects are read
+    zstandard = None
+
+S3_CODEC = os.environ.get("S3_CODEC", "gzip").lower()
+GZIP_LEVEL = int(os.environ.get("S3_GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.environ.get("S3_ZSTD_LEVEL", "3"))
+
+SUFFIXES = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+CONTENT_ENCODINGS = {"gzip": "gzip", "zstd": "zstd"}
+
+
+def resolve(codec=None):
+    codec = (codec or S3_CODEC).lower()
+    if codec not in SUFFIXES:
+        raise ValueError(f"Unknown codec {codec!r}; expected one of {sorted(SUFFIXES)}")
+    if codec == "zstd" and zstandard is None:
+        raise RuntimeError("S3_CODEC=zstd requires the zstandard package")
+    return codec
+
+
+def encoded_key(key, codec=None):
+    """Key with the codec's suffix (unchanged for "none" or when already suffixed)."""
+    suffix = SUFFIXES[resolve(codec)]
+    return key if not suffix or key.endswith(suffix) else key + suffix
+
+
+def strip_suffix(key):
+    """Key without a compression suffix, e.g. for ".csv" / ".json" checks."""
+    for suffix in SUFFIXES.values():
+        if suffix and key.endswith(suffix):
+            return key[: -len(suffix)]
+    return key
+
+
+def codec_of(key, content_encoding=None):
+    """Codec of a stored object from its Content-Encoding, falling back to the key suffix."""
+    if content_encoding:
+        for codec, encoding in CONTENT_ENCODINGS.items():
+            if content_encoding.lower() == encoding:
+                return codec
+    for codec, suffix in SUFFIXES.items():
+        if suffix and key.endswith(suffix):
+            return codec
+    return "none"
+
+
+# --- Compression ---
+def compress(data, codec=None):
+    codec = resolve(codec)
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return data
+
+
+def decompress(data, codec):
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Reading zstd objects requires the zstandard package")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+class _Identity:
+    def compress(self, data):
+        return data
+
+    def flush(self):
+        return b""
+
+
+def compressobj(codec=None):
+    """Incremental compressor (compress()/flush()) producing one stream, e.g. across multipart upload parts."""
+    codec = resolve(codec)
+    if codec == "gzip":
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    return _Identity()
+
+
+def object_args(codec=None):
+    """Extra put_object / create_multipart_upload arguments for the codec."""
+    codec = resolve(codec)
+    return {"ContentEncoding": CONTENT_ENCODINGS[codec]} if codec in CONTENT_ENCODINGS else {}
+
+
+# --- S3 helpers ---
+def put_object(s3, bucket, key, body, codec=None, **kwargs):
+    """Compress and upload body (str or bytes) under the codec's key; returns the key written."""
+    codec = resolve(codec)
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    key = encoded_key(key, codec)
+    s3.put_object(Bucket=bucket, Key=key, Body=compress(body, codec), **object_args(codec), **kwargs)
+    return key
+
+
+def variants(key):
+    """The key under every codec, the current codec's first."""
+    base = strip_suffix(key)
+    return list(dict.fromkeys([encoded_key(base)] + [base + suffix for suffix in SUFFIXES.values()]))
+
+
+def replace_object(s3, bucket, key, body, codec=None, **kwargs):
+    """put_object for a fixed key, then delete its copies under other codecs (e.g. the plain file from before S3_CODEC)."""
+    written = put_object(s3, bucket, key, body, codec, **kwargs)
+    stale = [k for k in variants(key) if k != written]
+    s3.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": k} for k in stale], "Quiet": True})
+    return written
+
+
+def read_body(obj, key):
+    """Whole decompressed body of a get_object response."""
+    return decompress(obj["Body"].read(), codec_of(key, obj.get("ContentEncoding")))
+
+
+def open_body(obj, key):
+    """File-like reader that decompresses a get_object response while it streams."""
+    codec = codec_of(key, obj.get("ContentEncoding"))
+    body = obj["Body"]
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=body, mode="rb")
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Reading zstd objects requires the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(body)
+    return body
+
+
+def get_text(s3, bucket, key):
+    """Decompressed UTF-8 text of an object."""
+    return read_body(s3.get_object(Bucket=bucket, Key=key), key).decode("utf-8")
+
+
+def get_text_any(s3, bucket, key):
+    """Text of key as written by the current codec, falling back to its copies under other codecs
+    (the plain pre-compression key, or the previous S3_CODEC).
+
+    Raises s3.exceptions.NoSuchKey when none exists.
+    """
+    missing = None
+    for candidate in variants(key):
+        try:
+            return get_text(s3, bucket, candidate)
+        except s3.exceptions.NoSuchKey as e:
+            missing = e
+    raise missing
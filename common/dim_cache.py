@@ -0,0 +1,116 @@
+# /common/dim_cache.py: content-addressed cache of written dimension rows, so unchanged rows are not re-uploaded
+#
+# Usage:
+#   cache = dim_cache.DimensionCache(s3, raw_bucket, "api_ingest")
+#   cache.put(f"forecast_data/location_dim/{location_id}.json", json.dumps(location_data))   # PUT only if new/changed
+#   cache.flush()                                                                              # once per invocation
+#
+# The cache maps each written object key to a digest of its body. It lives in /tmp (survives
+# while the Lambda container stays warm) and in a small S3 index (indexes/dim_cache/<name>.json
+# in the same bucket) that seeds cold starts. An unchanged row therefore costs no request at all;
+# only a cold start pays one GET for the index, and flush() one PUT when something was written.
+#
+# Cached keys must be the same in every process, or the S3 index never matches after a cold start:
+# build dimension ids with stable_id() (or from the data itself), never with the per-process salted hash().
+#
+# The cache assumes this writer is the only one changing its dimension objects. If objects are
+# deleted or rewritten elsewhere, delete the index (or set DIM_CACHE=false) to force full writes.
+#
+# A skipped row never reaches the next forecast_etl run as a new raw file. Facts of that run
+# referencing it (e.g. forecast_fact -> forecast_time_dim) are placed in time through the id -> hour
+# index forecast_etl keeps of every processed time dim row (rollups.with_stored_hours).
+import hashlib
+import json
+import logging
+import os
+
+import codec
+
+logger = logging.getLogger(__name__)
+
+DIM_CACHE = os.environ.get("DIM_CACHE", "true").lower() == "true"
+DIM_CACHE_DIR = os.environ.get("DIM_CACHE_DIR", "/tmp/dim_cache")
+DIM_CACHE_PREFIX = os.environ.get("DIM_CACHE_PREFIX", "indexes/dim_cache")
+# Oldest entries are dropped beyond this, which only costs a repeated PUT
+DIM_CACHE_MAX_ENTRIES = int(os.environ.get("DIM_CACHE_MAX_ENTRIES", "50000"))
+
+
+def stable_id(text, modulo=1000000):
+    """Process-independent replacement for hash(text) % modulo (str hashes are salted per process)."""
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest(), 16) % modulo
+
+
+def digest(body):
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return hashlib.sha256(body).hexdigest()
+
+
+class DimensionCache:
+    """Skips put_object for dimension objects whose body digest matches the last write."""
+
+    def __init__(self, s3, bucket, name):
+        self.s3 = s3
+        self.bucket = bucket
+        self.index_key = f"{DIM_CACHE_PREFIX}/{name}.json"
+        self.local_path = os.path.join(DIM_CACHE_DIR, f"{bucket}_{name}.json")
+        self.digests = self._load() if DIM_CACHE else {}
+        self.dirty = False
+        self.written = 0
+        self.skipped = 0
+
+    def _load(self):
+        # Warm container: local copy from the previous invocation
+        try:
+            with open(self.local_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+        # Cold start: index written by earlier containers
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=self.index_key)
+            digests = json.loads(obj["Body"].read().decode("utf-8"))
+            logger.info(f"Loaded dimension cache index s3://{self.bucket}/{self.index_key} ({len(digests)} entries)")
+            return digests
+        except self.s3.exceptions.NoSuchKey:
+            return {}
+        except Exception as e:
+            logger.warning(f"Could not load dimension cache index {self.index_key}: {e}")
+            return {}
+
+    def put(self, key, body, **kwargs):
+        """Upload body under key (via codec.put_object) unless the same body was written before; returns True if uploaded."""
+        key = codec.encoded_key(key)
+        body_digest = digest(body)
+        if DIM_CACHE and self.digests.get(key) == body_digest:
+            self.skipped += 1
+            return False
+        codec.put_object(self.s3, self.bucket, key, body, **kwargs)
+        self.written += 1
+        if DIM_CACHE:
+            self.digests.pop(key, None)  # re-insert as newest
+            self.digests[key] = body_digest
+            self.dirty = True
+        return True
+
+    def flush(self):
+        """Persist the cache to /tmp and to the S3 index if anything was written; failures are only logged."""
+        logger.info(f"Dimension cache: {self.written} written, {self.skipped} unchanged")
+        if not self.dirty:
+            return
+        if len(self.digests) > DIM_CACHE_MAX_ENTRIES:
+            self.digests = dict(list(self.digests.items())[-DIM_CACHE_MAX_ENTRIES:])
+        body = json.dumps(self.digests)
+        try:
+            os.makedirs(DIM_CACHE_DIR, exist_ok=True)
+            with open(self.local_path, "w") as f:
+                f.write(body)
+        except OSError as e:
+            logger.warning(f"Could not write dimension cache {self.local_path}: {e}")
+        try:
+            self.s3.put_object(Bucket=self.bucket, Key=self.index_key, Body=body.encode("utf-8"))
+        except Exception as e:
+            # The rows are written already; a stale index only costs repeated PUTs after a cold start
+            logger.warning(f"Could not write dimension cache index {self.index_key}: {e}")
+            return
+        self.dirty = False
@@ -0,0 +1,177 @@
+# /common/schema.py: table schema registry -- pandas dtypes for parsing and Glue column types, in one place
+#
+# Usage:
+#   df = schema.apply(df, "forecast_fact")          # compact dtypes right after parsing a raw file
+#   combined = schema.apply(pd.concat(dfs), "forecast_fact")   # concat turns mixed categoricals back into strings
+#   body = schema.output_frame(df).to_json(orient="records", lines=True, date_format="iso")
+#
+#   python common/schema.py > common/glue_columns.json   # Glue column definitions read by "3 1 4 glue.tf"
+#   python common/schema.py --check                      # fails if glue_columns.json is stale
+#
+# Frames are kept compact: small-range ints as nullable Int8/Int16/Int32, measurements as
+# float32, repeated strings (conditions, dates, names) as categoricals. Int columns stay
+# nullable so bad values coerce to <NA> instead of failing the file. float32 columns are
+# widened back to float64 by output_frame() before serializing, so JSON carries the values as
+# parsed (12.3, not 12.3000001907).
+import json
+import logging
+import os
+import sys
+from collections import namedtuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+GLUE_COLUMNS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "glue_columns.json")
+
+# dtype None leaves the parsed column as it is
+Column = namedtuple("Column", ["name", "glue_type", "dtype", "comment"], defaults=[None])
+
+UTC = "datetime64[ns, UTC]"
+
+
+def _time_dim(id_col):
+    """Columns shared by the per-source time dimensions."""
+    return [
+        Column(id_col, "bigint", "Int64"),
+        Column("date", "date", "category"),
+        Column("hour", "int", "Int8"),
+        Column("day", "int", "Int8"),
+        Column("month", "int", "Int8"),
+        Column("year", "int", "Int16"),
+        Column("time_id", "bigint", "Int32", "YYYYMMDDHH, added by forecast_etl.py"),
+        Column("datetime", "timestamp", UTC),
+    ]
+
+
+# Keyed by the processed table name (last part of the S3 prefix)
+TABLES = {
+    "forecast_fact": [
+        Column("forecast_id", "string", None),
+        Column("location_id", "bigint", "Int32"),
+        Column("time_id", "bigint", "Int32"),
+        Column("temperature_c", "double", "float32"),
+        Column("rain_mm", "double", "float32"),
+        Column("solarradiation_w", "double", "float32"),
+        Column("cloudcover", "int", "Int8"),
+        Column("wind_speed_kmh", "double", "float32"),
+        Column("humidity", "double", "float32"),
+        Column("weather_condition", "string", "category"),
+        Column("issued_at", "timestamp", UTC, "LastModified of the raw forecast_fact object, set by forecast_etl.py"),
+    ],
+    "forecast_time_dim": [Column("forecast_time_id", "bigint", "Int32")] + _time_dim("forecast_time_id")[1:],
+    "download_time_dim": [
+        Column("download_time_id", "bigint", "Int32"),
+        Column("timestamp", "timestamp", "category"),
+    ] + _time_dim("download_time_id")[2:],
+    "location_dim": [
+        Column("location_id", "bigint", "Int32"),
+        Column("city", "string", "category"),
+        Column("country", "string", "category"),
+        Column("latitude", "double", "float64"),  # float32 would round coordinates to ~1 m
+        Column("longitude", "double", "float64"),
+    ],
+    "solar_time_dim": _time_dim("solar_energy_time_id"),
+    "solar_fact": [
+        Column("energy_id", "bigint", "Int64"),
+        Column("location_id", "bigint", "Int32", "FK to locations_dim.location_id"),
+        Column("energy_time_id", "bigint", "Int64", "FK to solar_energy_time_dim.solar_energy_time_id"),
+        Column("solarenergy_kwh", "decimal(10,2)", "float32"),
+        Column("solarenergy_kwh_sum_day", "decimal(10,2)", "float32"),
+        Column("date_uploaded", "date", "category"),
+    ],
+    "water_level_time_dim": _time_dim("water_level_time_id"),
+    "water_level_fact": [
+        Column("water_level_id", "bigint", "Int64"),
+        Column("location_id", "bigint", "Int32", "FK to locations_dim.location_id"),
+        Column("level_time_id", "bigint", "Int64", "FK to water_level_time_dim.water_level_time_id"),
+        Column("water_level_mm", "bigint", "Int32"),
+        Column("rain_collected_mm", "bigint", "Int32"),
+        Column("date_uploaded", "date", "category"),
+    ],
+    # Generated by time_dim_gen.py; datetime/date stay naive, as generated
+    "time_dim": [
+        Column("time_id", "bigint", "Int32", "unique time identifier (e.g., 2025102913)"),
+        Column("datetime", "timestamp", None, "full timestamp (UTC)"),
+        Column("date", "date", None, "date portion of timestamp"),
+        Column("hour", "int", "Int8", "hour of the day (0-23)"),
+        Column("day", "int", "Int8", "day of the month (1-31)"),
+        Column("month", "int", "Int8", "month number (1-12)"),
+        Column("year", "int", "Int16", "4-digit year"),
+        Column("weekday_name", "string", "category", "name of the weekday (e.g., Monday)"),
+        Column("is_weekend", "boolean", "bool", "boolean flag for weekend"),
+    ],
+}
+
+
+def table_of(prefix):
+    """Registry table name of an S3 prefix ("forecast_data/forecast_fact/" -> "forecast_fact"), or None."""
+    name = prefix.rstrip("/").split("/")[-1]
+    return name if name in TABLES else None
+
+
+def dtypes(*tables):
+    """column -> pandas dtype of the given tables (first table wins on shared columns)."""
+    merged = {}
+    for table in tables:
+        for col in TABLES[table]:
+            if col.dtype is not None:
+                merged.setdefault(col.name, col.dtype)
+    return merged
+
+
+# --- Pandas ---
+def _cast(series, dtype):
+    if dtype == "category":
+        return series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype("category")
+    if dtype == UTC:
+        return pd.to_datetime(series, errors="coerce", utc=True)
+    if dtype == "bool":
+        return series.astype(bool)
+    # Ints and floats: unparseable values become <NA>/NaN
+    return pd.to_numeric(series, errors="coerce").astype(dtype)
+
+
+def apply(df, *tables):
+    """Cast the registry columns of df (in place) to their compact dtypes; other columns are left alone."""
+    for name, dtype in dtypes(*tables).items():
+        if name not in df.columns or str(df[name].dtype) == dtype:
+            continue
+        try:
+            df[name] = _cast(df[name], dtype)
+        except (TypeError, ValueError, OverflowError) as e:
+            # e.g. fractional values in an int column: keep them rather than lose the file
+            logger.warning(f"[schema] {name} not cast to {dtype}: {e}")
+    return df
+
+
+def output_frame(df):
+    """df with float32 columns widened to float64 at their shortest decimal repr, ready for to_json."""
+    floats = [c for c in df.columns if df[c].dtype == "float32"]
+    if not floats:
+        return df
+    return df.assign(**{c: df[c].astype(str).astype("float64") for c in floats})
+
+
+# --- Glue ---
+def glue_columns():
+    """table -> [{"name", "type"[, "comment"]}], the columns blocks of the Glue catalog tables."""
+    return {
+        table: [{"name": c.name, "type": c.glue_type, **({"comment": c.comment} if c.comment else {})} for c in cols]
+        for table, cols in TABLES.items()
+    }
+
+
+def glue_columns_json():
+    return json.dumps(glue_columns(), indent=2) + "\n"
+
+
+if __name__ == "__main__":
+    if "--check" in sys.argv[1:]:
+        with open(GLUE_COLUMNS_FILE) as f:
+            if f.read() != glue_columns_json():
+                sys.exit(f"{GLUE_COLUMNS_FILE} is stale; regenerate with: python common/schema.py > common/glue_columns.json")
+        print(f"{GLUE_COLUMNS_FILE} is up to date")
+    else:
+        sys.stdout.write(glue_columns_json())
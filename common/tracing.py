@@ -0,0 +1,197 @@
+# /common/tracing.py: lightweight per-stage timers for the ingest lambdas and forecast_etl
+#
+# Usage:
+#   s3 = tracing.instrument_client(boto3.client("s3"))   # list/get/put/metric-publish spans per AWS call
+#
+#   @tracing.traced("api_ingest")           # or: with tracing.traced("forecast_etl.prefix", prefix=p):
+#   def lambda_handler(event, context):
+#       with tracing.span("parse") as sp:
+#           data = json.loads(body)
+#           sp["bytes"] += len(body)
+#
+# Spans with the same step name are aggregated and emitted once per trace as one
+# JSON log record: {"trace", "step", "calls", "duration_ms", "self_ms", "count", "bytes", ...}.
+# self_ms excludes time spent in nested spans (e.g. S3 puts inside a transform loop).
+# TRACE_PROFILE=true additionally runs cProfile around the trace and writes the stats
+# to /tmp (and to s3://$TRACE_PROFILE_BUCKET/profiles/ when set). Glue jobs take no environment
+# variables; forecast_etl.py sets both from its --TRACE_PROFILE / --TRACE_PROFILE_BUCKET arguments.
+import cProfile
+import functools
+import json
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+TRACE_PROFILE = os.environ.get("TRACE_PROFILE", "false").lower() == "true"
+TRACE_PROFILE_BUCKET = os.environ.get("TRACE_PROFILE_BUCKET")
+TRACE_PROFILE_DIR = os.environ.get("TRACE_PROFILE_DIR", "/tmp")
+
+# Step names for instrumented AWS operations; anything else is reported by operation name
+OPERATION_STEPS = {
+    "ListObjectsV2": "list",
+    "GetObject": "get",
+    "HeadObject": "get",
+    "PutObject": "put",
+    "UploadPart": "put",
+    "PutMetricData": "metric-publish",
+}
+
+_current = None  # active trace of this process
+
+
+class Trace:
+    """Aggregated span totals for one execution of an entry point."""
+
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.steps = {}
+        self.stack = []  # [start, child_seconds] of open spans
+        self.started = time.perf_counter()
+
+    def push(self):
+        self.stack.append([time.perf_counter(), 0.0])
+
+    def pop(self, step, count, nbytes):
+        start, child = self.stack.pop()
+        duration = time.perf_counter() - start
+        if self.stack:
+            self.stack[-1][1] += duration
+        totals = self.steps.setdefault(step, {"calls": 0, "duration_ms": 0.0, "self_ms": 0.0, "count": 0, "bytes": 0})
+        totals["calls"] += 1
+        totals["duration_ms"] += duration * 1000
+        totals["self_ms"] += (duration - child) * 1000
+        totals["count"] += count
+        totals["bytes"] += nbytes
+
+    def emit(self):
+        for step, totals in self.steps.items():
+            record = {"trace": self.name, "step": step, **self.attrs, **totals}
+            record["duration_ms"] = round(totals["duration_ms"], 3)
+            record["self_ms"] = round(totals["self_ms"], 3)
+            logger.info(json.dumps(record))
+        total_ms = round((time.perf_counter() - self.started) * 1000, 3)
+        logger.info(json.dumps({"trace": self.name, "step": "total", **self.attrs, "duration_ms": total_ms}))
+
+
+@contextmanager
+def span(step, count=0, nbytes=0):
+    """Time one step; the yielded dict's "count" and "bytes" can be increased inside the block."""
+    sp = {"count": count, "bytes": nbytes}
+    trace = _current
+    if trace is None:
+        yield sp
+        return
+    trace.push()
+    try:
+        yield sp
+    finally:
+        trace.pop(step, sp["count"], sp["bytes"])
+
+
+def annotate(**attrs):
+    """Attach attributes (e.g. prefix=...) to every record of the active trace."""
+    if _current is not None:
+        _current.attrs.update(attrs)
+
+
+class traced:
+    """Start a trace for an entry point; usable as a decorator or a context manager."""
+
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with traced(self.name, **self.attrs):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def __enter__(self):
+        global _current
+        self.previous = _current
+        self.trace = _current = Trace(self.name, **self.attrs)
+        self.profiler = cProfile.Profile() if TRACE_PROFILE else None
+        if self.profiler:
+            self.profiler.enable()
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        global _current
+        if self.profiler:
+            self.profiler.disable()
+            dump_profile(self.profiler, self.trace)
+        self.trace.emit()
+        _current = self.previous
+        return False
+
+
+# --- boto3 client instrumentation ---
+def _body_size(body):
+    if isinstance(body, (bytes, bytearray, str)):
+        return len(body)
+    if hasattr(body, "getbuffer"):  # botocore wraps bytes bodies in BytesIO
+        return body.getbuffer().nbytes
+    return 0
+
+
+def _before_call(model, params, context, **kwargs):
+    trace = _current
+    if trace is None:
+        return
+    trace.push()
+    context["trace"] = trace
+    context["trace_step"] = OPERATION_STEPS.get(model.name, model.name)
+    context["trace_bytes"] = _body_size(params.get("body"))
+
+
+def _after_call(model, context, parsed=None, **kwargs):
+    trace = context.pop("trace", None)
+    if trace is None:
+        return
+    step = context.pop("trace_step", model.name)
+    nbytes = context.pop("trace_bytes", 0)
+    if isinstance(parsed, dict):
+        # GetObject: ContentLength of the streamed body (read later by the caller)
+        nbytes += parsed.get("ContentLength", 0) if model.name in ("GetObject", "HeadObject") else 0
+    trace.pop(step, 1, nbytes)
+
+
+def _after_call_error(context, exception, **kwargs):
+    # Transport errors (no response, so no model/parsed): close the span and let the exception propagate
+    trace = context.pop("trace", None)
+    if trace is None:
+        return
+    trace.pop(context.pop("trace_step", "error"), 1, context.pop("trace_bytes", 0))
+
+
+def instrument_client(client):
+    """Record a span for every AWS call made through the client while a trace is active."""
+    client.meta.events.register("before-call", _before_call)
+    client.meta.events.register("after-call", _after_call)
+    client.meta.events.register("after-call-error", _after_call_error)
+    return client
+
+
+def dump_profile(profiler, trace):
+    """Write cProfile stats to TRACE_PROFILE_DIR and optionally upload them to S3."""
+    suffix = "_".join(str(v) for v in trace.attrs.values())
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{trace.name}_{suffix}".rstrip("_"))
+    filename = f"{name}_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}_{os.getpid()}.prof"
+    path = os.path.join(TRACE_PROFILE_DIR, filename)
+    try:
+        profiler.dump_stats(path)
+        logger.info(f"Wrote profile {path}")
+        if TRACE_PROFILE_BUCKET:
+            import boto3
+            boto3.client("s3").upload_file(path, TRACE_PROFILE_BUCKET, f"profiles/{trace.name}/{filename}")
+            logger.info(f"Uploaded profile to s3://{TRACE_PROFILE_BUCKET}/profiles/{trace.name}/{filename}")
+    except Exception as e:
+        logger.warning(f"Could not write profile {path}: {e}")
@@ -2,6 +2,25 @@ data "aws_s3_bucket" "RAW_BUCKET" {
   bucket = aws_s3_bucket.forecast_raw.bucket
 }
 
+# Lambda package: handler plus the common/ modules it imports, rebuilt when any of them changes
+data "archive_file" "json_ingest" {
+  type        = "zip"
+  output_path = "${path.module}/build/json_ingest.zip"
+
+  source {
+    content  = file("${path.module}/lambda_JSON_ingest/json_ingest.py")
+    filename = "json_ingest.py"
+  }
+
+  dynamic "source" {
+    for_each = ["common/tracing.py", "common/codec.py", "common/dim_cache.py"]
+    content {
+      content  = file("${path.module}/${source.value}")
+      filename = basename(source.value)
+    }
+  }
+}
+
 resource "aws_lambda_function" "json_ingest" {
   function_name = "json_ingest"
   role          = aws_iam_role.json_ingest_lambda_role.arn
@@ -9,8 +28,8 @@ resource "aws_lambda_function" "json_ingest" {
   runtime       = "python3.12"
   timeout       = 600
 
-  filename         = "${path.module}/json_ingest.zip"
-  source_code_hash = filebase64sha256("${path.module}/json_ingest.zip")
+  filename         = data.archive_file.json_ingest.output_path
+  source_code_hash = data.archive_file.json_ingest.output_base64sha256
   layers = [
 
   ]
@@ -21,6 +40,7 @@ resource "aws_lambda_function" "json_ingest" {
       latitude      = var.latitude
       longitude     = var.longitude
       LOG_LEVEL     = "INFO"
+      S3_CODEC      = var.s3_codec
     }
   }
 }
@@ -4,12 +4,15 @@ import boto3
 import os
 import logging
 import json
+import tracing
+import codec
+import dim_cache
 from datetime import datetime, UTC, timezone
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
-s3 = boto3.client('s3')
-cloudwatch = boto3.client("cloudwatch")
+s3 = tracing.instrument_client(boto3.client('s3'))
+cloudwatch = tracing.instrument_client(boto3.client("cloudwatch"))
 raw_bucket = os.getenv("S3_RAW_BUCKET")
 
 def publish_metric(metric_name, value, unit, location, forecast_date, forecast_hour):
@@ -31,6 +34,7 @@ def publish_metric(metric_name, value, unit, location, forecast_date, forecast_h
 
 
 # List objects in the specified S3 bucket
+@tracing.traced("json_ingest")
 def lambda_handler(event, context):
     bucket_name = raw_bucket
     prefix = "uploads/hist/"
@@ -42,7 +46,7 @@ def lambda_handler(event, context):
     # Download time metadata (for download_time_dim)
     
     # Location data (for location_dim)
-    location_id = hash(f"{latitude}_{longitude}") % 1000000
+    location_id = dim_cache.stable_id(f"{latitude}_{longitude}")
     location_data = {
         "location_id": location_id,
         "city": city,
@@ -51,24 +55,28 @@ def lambda_handler(event, context):
         "longitude": longitude
     }
     
+    # location_dim and the time dims repeat across history files; only new or changed rows are uploaded
+    dims = dim_cache.DimensionCache(s3, raw_bucket, "json_ingest")
+
     response = s3.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
 
     for obj in response.get('Contents', []):
         key = obj['Key']
 
         # Skip the folder object itself, process JSON files only and log skipped objects
-        if key.endswith('/') or not key.endswith('.json'):
+        if key.endswith('/') or not codec.strip_suffix(key).endswith('.json'):
             logger.info(f"Skipping non-JSON or folder object: {key}")
             continue
         logger.info(f"Processing JSON object {key}")
 
         # Get content from JSON object
         s3_object = s3.get_object(Bucket=bucket_name, Key=key)
-        file_content = s3_object['Body'].read().decode('utf-8')
+        file_content = codec.read_body(s3_object, key).decode('utf-8')
 
         # Skip invalid JSON files
         try:
-            data = json.loads(file_content)
+            with tracing.span("parse", count=1, nbytes=len(file_content)):
+                data = json.loads(file_content)
         except json.JSONDecodeError as e:
             logger.warning(f"Skipping invalid JSON file {key}: {e}")
             continue
@@ -88,7 +96,7 @@ def lambda_handler(event, context):
         download_day = int(last_modified.strftime("%d"))
         download_month = int(last_modified.strftime("%m"))
         download_year = int(last_modified.strftime("%Y"))
-        download_time_id = hash(download_timestamp) % 1000000
+        download_time_id = dim_cache.stable_id(download_timestamp)
 
         download_time_data = {
             "download_time_id": download_time_id,
@@ -104,79 +112,78 @@ def lambda_handler(event, context):
 
         # Process forecast data
         forecast_records = []
-        for day in data["days"]:
-            forecast_date = day["datetime"]
-            forecast_day = int(datetime.strptime(forecast_date, "%Y-%m-%d").strftime("%d"))
-            forecast_month = int(datetime.strptime(forecast_date, "%Y-%m-%d").strftime("%m"))
-            forecast_year = int(datetime.strptime(forecast_date, "%Y-%m-%d").strftime("%Y"))
-
-            for hour_data in day["hours"]:
-                hour_str = hour_data["datetime"]
-                hour = int(hour_str.split(":")[0])
-                forecast_timestamp = f"{forecast_date} {hour_str}"
-                forecast_time_id = hash(forecast_timestamp) % 1000000
-
-               # Forecast time data (for forecast_time_dim)
-                forecast_time_data = {
-                    "forecast_time_id": forecast_time_id,
-                    "date": f"{forecast_date}T{hour:02d}:00:00Z",
-                    "hour": hour,
-                    "day": forecast_day,
-                    "month": forecast_month,
-                    "year": forecast_year
-                }
-
-                # Forecast fact data (for forecast_fact table)
-                forecast_record = {
-                    "forecast_id": f"{location_id}_{forecast_time_id}_{context.aws_request_id}",
-                    "location_id": location_id,
-                    "time_id": forecast_time_id,
-                    "temperature_c": float(hour_data["temp"]),
-                    "rain_mm": float(hour_data["precip"]),
-                    "solarradiation_w": float(hour_data["solarradiation"]),
-                    "cloudcover": int(hour_data["cloudcover"]),
-                    "wind_speed_kmh": float(hour_data["windspeed"]),
-                    "humidity": float(hour_data["humidity"]),
-                    "weather_condition": hour_data["conditions"]
-                }
-                forecast_records.append(forecast_record)
-
-                # Publish CloudWatch metrics
-                try:
-                    publish_metric("TemperatureC", hour_data["temp"], "None", city, forecast_date, hour)
-                    publish_metric("RainfallMM", hour_data["precip"], "Millimeters", city, forecast_date, hour)
-                    publish_metric("SolarRadiationW", hour_data["solarradiation"], "Watts", city, forecast_date, hour)
-                    publish_metric("WindSpeedKMH", hour_data["windspeed"], "Kilometers/Hour", city, forecast_date, hour)
-                    publish_metric("Humidity", hour_data["humidity"], "Percent", city, forecast_date, hour)
-                    publish_metric("CloudCover", hour_data["cloudcover"], "Percent", city, forecast_date, hour)
-                except Exception as e:
-                    logger.warning(f"Failed to send CloudWatch metric: {str(e)}")
-
-                # Write forecast_time_dim data to S3 raw bucket
-                try:
-                    s3.put_object(
-                        Bucket=raw_bucket,
-                        Key=f"forecast_data/forecast_time_dim/{forecast_time_data['forecast_time_id']}.json",
-                        Body=json.dumps(forecast_time_data)
-                    )
-                except Exception as e:
-                    return {
-                        "statusCode": 500,
-                        "body": json.dumps({"error": f"S3 write failed for forecast_time: {str(e)}"})
+        with tracing.span("transform") as transform_sp:
+            for day in data["days"]:
+                forecast_date = day["datetime"]
+                forecast_day = int(datetime.strptime(forecast_date, "%Y-%m-%d").strftime("%d"))
+                forecast_month = int(datetime.strptime(forecast_date, "%Y-%m-%d").strftime("%m"))
+                forecast_year = int(datetime.strptime(forecast_date, "%Y-%m-%d").strftime("%Y"))
+
+                for hour_data in day["hours"]:
+                    hour_str = hour_data["datetime"]
+                    hour = int(hour_str.split(":")[0])
+                    # YYYYMMDDHH: the same hour has the same id in every process and in both ingest lambdas
+                    forecast_time_id = forecast_year * 1000000 + forecast_month * 10000 + forecast_day * 100 + hour
+
+                   # Forecast time data (for forecast_time_dim)
+                    forecast_time_data = {
+                        "forecast_time_id": forecast_time_id,
+                        "date": f"{forecast_date}T{hour:02d}:00:00Z",
+                        "hour": hour,
+                        "day": forecast_day,
+                        "month": forecast_month,
+                        "year": forecast_year
+                    }
+
+                    # Forecast fact data (for forecast_fact table)
+                    forecast_record = {
+                        "forecast_id": f"{location_id}_{forecast_time_id}_{context.aws_request_id}",
+                        "location_id": location_id,
+                        "time_id": forecast_time_id,
+                        "temperature_c": float(hour_data["temp"]),
+                        "rain_mm": float(hour_data["precip"]),
+                        "solarradiation_w": float(hour_data["solarradiation"]),
+                        "cloudcover": int(hour_data["cloudcover"]),
+                        "wind_speed_kmh": float(hour_data["windspeed"]),
+                        "humidity": float(hour_data["humidity"]),
+                        "weather_condition": hour_data["conditions"]
                     }
-                logger.info(f"Wrote forecast_time_dim for forecast_time_id: {forecast_time_data['forecast_time_id']}")
+                    forecast_records.append(forecast_record)
+                    transform_sp["count"] += 1
+
+                    # Publish CloudWatch metrics
+                    try:
+                        publish_metric("TemperatureC", hour_data["temp"], "None", city, forecast_date, hour)
+                        publish_metric("RainfallMM", hour_data["precip"], "Millimeters", city, forecast_date, hour)
+                        publish_metric("SolarRadiationW", hour_data["solarradiation"], "Watts", city, forecast_date, hour)
+                        publish_metric("WindSpeedKMH", hour_data["windspeed"], "Kilometers/Hour", city, forecast_date, hour)
+                        publish_metric("Humidity", hour_data["humidity"], "Percent", city, forecast_date, hour)
+                        publish_metric("CloudCover", hour_data["cloudcover"], "Percent", city, forecast_date, hour)
+                    except Exception as e:
+                        logger.warning(f"Failed to send CloudWatch metric: {str(e)}")
+
+                    # Write forecast_time_dim data to S3 raw bucket
+                    try:
+                        dims.put(
+                            f"forecast_data/forecast_time_dim/{forecast_time_data['forecast_time_id']}.json",
+                            json.dumps(forecast_time_data, sort_keys=True)
+                        )
+                    except Exception as e:
+                        return {
+                            "statusCode": 500,
+                            "body": json.dumps({"error": f"S3 write failed for forecast_time: {str(e)}"})
+                        }
+                    logger.info(f"Wrote forecast_time_dim for forecast_time_id: {forecast_time_data['forecast_time_id']}")
         # Write location_dim and download_time_dim data to S3 raw bucket
         try:
-            s3.put_object(
-                Bucket=raw_bucket,
-                Key=f"forecast_data/location_dim/{location_data['location_id']}.json",
-                Body=json.dumps(location_data)
+            dims.put(
+                f"forecast_data/location_dim/{location_data['location_id']}.json",
+                json.dumps(location_data, sort_keys=True)
             )
             logger.info(f"Wrote location_dim for location_id: {location_data['location_id']}")
-            s3.put_object(
-                Bucket=raw_bucket,
-                Key=f"forecast_data/download_time_dim/{download_time_data['download_time_id']}.json",
-                Body=json.dumps(download_time_data)
+            dims.put(
+                f"forecast_data/download_time_dim/{download_time_data['download_time_id']}.json",
+                json.dumps(download_time_data, sort_keys=True)
             )
             logger.info(f"Wrote download_time_dim for download_time_id: {download_time_data['download_time_id']}")
         except Exception as e:
@@ -188,10 +195,11 @@ def lambda_handler(event, context):
     # Write forecast_fact data to S3 raw bucket
         try:
             for record in forecast_records:
-                s3.put_object(
-                    Bucket=raw_bucket,
-                    Key=f"forecast_data/forecast_fact/{record['forecast_id']}.json",
-                    Body=json.dumps(record)
+                codec.put_object(
+                    s3,
+                    raw_bucket,
+                    f"forecast_data/forecast_fact/{record['forecast_id']}.json",
+                    json.dumps(record)
                 )
                 logger.info(f"Wrote forecast_fact for forecast_id: {record['forecast_id']}")
         except Exception as e:
@@ -200,6 +208,7 @@ def lambda_handler(event, context):
                 "body": json.dumps({"error": f"S3 write failed for forecast data: {str(e)}"})
             }
 
+        dims.flush()
         return {
             "statusCode": 200,
             "body": json.dumps({"message": f"Successfully ingested {len(forecast_records)} forecast records"})
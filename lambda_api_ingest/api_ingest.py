@@ -4,12 +4,15 @@ import json
 import os
 import boto3
 import requests
+import tracing
+import codec
+import dim_cache
 from datetime import datetime, UTC, timezone
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
-s3 = boto3.client("s3")
-cloudwatch = boto3.client("cloudwatch")
+s3 = tracing.instrument_client(boto3.client("s3"))
+cloudwatch = tracing.instrument_client(boto3.client("cloudwatch"))
 
 def publish_metric(metric_name, value, unit, location, forecast_date, forecast_hour):
     from datetime import datetime
@@ -28,6 +31,7 @@ def publish_metric(metric_name, value, unit, location, forecast_date, forecast_h
     )
     logger.info(f"Metric {metric_name}={value} at {timestamp} for {location}")
 
+@tracing.traced("api_ingest")
 def lambda_handler(event, context):
     # Configuration from environment variables
     api_key = os.getenv("VISUALCROSSING_API_KEY")
@@ -40,13 +44,16 @@ def lambda_handler(event, context):
 
     # Make API request
     try:
-        response = requests.get(url, timeout=10)
+        with tracing.span("api-request", count=1) as sp:
+            response = requests.get(url, timeout=10)
+            sp["bytes"] += len(response.content)
         if response.status_code != 200:
             return {
                 "statusCode": response.status_code,
                 "body": json.dumps({"error": f"API error: {response.text}"})
             }
-        forecast_data = response.json()
+        with tracing.span("parse", count=1):
+            forecast_data = response.json()
         logger.info(f"Received {len(forecast_data)} top-level keys")
     except Exception as e:
         return {
@@ -58,13 +65,14 @@ def lambda_handler(event, context):
     dl_timestamp = datetime.now(UTC)
     download_timestamp_str = dl_timestamp.strftime("%Y%m%dT%H%M%S")
 
-    s3.put_object(
-        Bucket=raw_bucket,
-        Key=f"uploads/forecast/forecast_{download_timestamp_str}.json",
-        Body=json.dumps(forecast_data, sort_keys=True).encode("utf-8")
+    upload_key = codec.put_object(
+        s3,
+        raw_bucket,
+        f"uploads/forecast/forecast_{download_timestamp_str}.json",
+        json.dumps(forecast_data, sort_keys=True)
     )
     
-    logger.info(f"forecast_{download_timestamp_str}.json written to S3")
+    logger.info(f"{upload_key} written to S3")
 
     # Download time metadata (for download_time_dim)
     download_timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
@@ -73,7 +81,7 @@ def lambda_handler(event, context):
     download_day = int(datetime.now(timezone.utc).strftime("%d"))
     download_month = int(datetime.now(timezone.utc).strftime("%m"))
     download_year = int(datetime.now(timezone.utc).strftime("%Y"))
-    download_time_id = hash(download_timestamp) % 1000000
+    download_time_id = dim_cache.stable_id(download_timestamp)
 
     download_time_data = {
         "download_time_id": download_time_id,
@@ -85,7 +93,7 @@ def lambda_handler(event, context):
     }
 
     # Location metadata (for location_dim)
-    location_id = hash(f"{latitude}_{longitude}") % 1000000
+    location_id = dim_cache.stable_id(f"{latitude}_{longitude}")
     location_data = {
         "location_id": location_id,
         "city": city,
@@ -94,94 +102,99 @@ def lambda_handler(event, context):
         "longitude": longitude
     }
 
+    # Dimension rows repeat run after run; only new or changed ones are uploaded
+    dims = dim_cache.DimensionCache(s3, raw_bucket, "api_ingest")
+
     # Process forecast data
     forecast_records = []
-    for day in forecast_data["days"]:
-        forecast_date = day["datetime"]
-        forecast_day = int(datetime.strptime(forecast_date, "%Y-%m-%d").strftime("%d"))
-        forecast_month = int(datetime.strptime(forecast_date, "%Y-%m-%d").strftime("%m"))
-        forecast_year = int(datetime.strptime(forecast_date, "%Y-%m-%d").strftime("%Y"))
-
-        for hour_data in day["hours"]:
-            hour_str = hour_data["datetime"]
-            hour = int(hour_str.split(":")[0])
-            forecast_timestamp = f"{forecast_date} {hour_str}"
-            forecast_time_id = hash(forecast_timestamp) % 1000000
-
-            # Forecast time data (for forecast_time_dim)
-            forecast_time_data = {
-                "forecast_time_id": forecast_time_id,
-                "date": f"{forecast_date}T{hour:02d}:00:00Z",
-                "hour": hour,
-                "day": forecast_day,
-                "month": forecast_month,
-                "year": forecast_year
-            }
+    with tracing.span("transform") as transform_sp:
+        for day in forecast_data["days"]:
+            forecast_date = day["datetime"]
+            forecast_day = int(datetime.strptime(forecast_date, "%Y-%m-%d").strftime("%d"))
+            forecast_month = int(datetime.strptime(forecast_date, "%Y-%m-%d").strftime("%m"))
+            forecast_year = int(datetime.strptime(forecast_date, "%Y-%m-%d").strftime("%Y"))
+
+            for hour_data in day["hours"]:
+                hour_str = hour_data["datetime"]
+                hour = int(hour_str.split(":")[0])
+                # YYYYMMDDHH: the same hour has the same id in every process and in both ingest lambdas
+                forecast_time_id = forecast_year * 1000000 + forecast_month * 10000 + forecast_day * 100 + hour
+
+                # Forecast time data (for forecast_time_dim)
+                forecast_time_data = {
+                    "forecast_time_id": forecast_time_id,
+                    "date": f"{forecast_date}T{hour:02d}:00:00Z",
+                    "hour": hour,
+                    "day": forecast_day,
+                    "month": forecast_month,
+                    "year": forecast_year
+                }
 
-            # Forecast fact data (for forecast_fact table)
-            forecast_record = {
-                "forecast_id": f"{location_id}_{forecast_time_id}_{context.aws_request_id}",
-                "location_id": location_id,
-                "time_id": forecast_time_id,
-                "temperature_c": float(hour_data["temp"]),
-                "rain_mm": float(hour_data["precip"]),
-                "solarradiation_w": float(hour_data["solarradiation"]),
-                "cloudcover": int(hour_data["cloudcover"]),
-                "wind_speed_kmh": float(hour_data["windspeed"]),
-                "humidity": float(hour_data["humidity"]),
-                "weather_condition": hour_data["conditions"]
-            }
-            forecast_records.append(forecast_record)
-
-            # Write forecast_time_dim data to S3 raw bucket
-            try:
-                s3.put_object(
-                    Bucket=raw_bucket,
-                    Key=f"forecast_data/forecast_time_dim/{forecast_time_data['forecast_time_id']}.json",
-                    Body=json.dumps(forecast_time_data, sort_keys=True)
-                )
-            except Exception as e:
-                return {
-                    "statusCode": 500,
-                    "body": json.dumps({"error": f"S3 write failed for forecast_time: {str(e)}"})
+                # Forecast fact data (for forecast_fact table)
+                forecast_record = {
+                    "forecast_id": f"{location_id}_{forecast_time_id}_{context.aws_request_id}",
+                    "location_id": location_id,
+                    "time_id": forecast_time_id,
+                    "temperature_c": float(hour_data["temp"]),
+                    "rain_mm": float(hour_data["precip"]),
+                    "solarradiation_w": float(hour_data["solarradiation"]),
+                    "cloudcover": int(hour_data["cloudcover"]),
+                    "wind_speed_kmh": float(hour_data["windspeed"]),
+                    "humidity": float(hour_data["humidity"]),
+                    "weather_condition": hour_data["conditions"]
                 }
+                forecast_records.append(forecast_record)
+                transform_sp["count"] += 1
+
+                # Write forecast_time_dim data to S3 raw bucket (an unchanged row is skipped; forecast_etl
+                # resolves this run's facts through its stored hour index, see common/dim_cache.py)
+                try:
+                    dims.put(
+                        f"forecast_data/forecast_time_dim/{forecast_time_data['forecast_time_id']}.json",
+                        json.dumps(forecast_time_data, sort_keys=True)
+                    )
+                except Exception as e:
+                    return {
+                        "statusCode": 500,
+                        "body": json.dumps({"error": f"S3 write failed for forecast_time: {str(e)}"})
+                    }
             
-            # Publish CloudWatch metrics
-            try:
-                publish_metric("TemperatureC", hour_data["temp"], "None", city, forecast_date, hour)
-                publish_metric("RainfallMM", hour_data["precip"], "Millimeters", city, forecast_date, hour)
-                publish_metric("SolarRadiationW", hour_data["solarradiation"], "Watts", city, forecast_date, hour)
-                publish_metric("WindSpeedKMH", hour_data["windspeed"], "Kilometers/Hour", city, forecast_date, hour)
-                publish_metric("Humidity", hour_data["humidity"], "Percent", city, forecast_date, hour)
-                publish_metric("CloudCover", hour_data["cloudcover"], "Percent", city, forecast_date, hour)
-            except Exception as e:
-                logger.warning(f"Failed to send CloudWatch metric: {str(e)}")
+                # Publish CloudWatch metrics
+                try:
+                    publish_metric("TemperatureC", hour_data["temp"], "None", city, forecast_date, hour)
+                    publish_metric("RainfallMM", hour_data["precip"], "Millimeters", city, forecast_date, hour)
+                    publish_metric("SolarRadiationW", hour_data["solarradiation"], "Watts", city, forecast_date, hour)
+                    publish_metric("WindSpeedKMH", hour_data["windspeed"], "Kilometers/Hour", city, forecast_date, hour)
+                    publish_metric("Humidity", hour_data["humidity"], "Percent", city, forecast_date, hour)
+                    publish_metric("CloudCover", hour_data["cloudcover"], "Percent", city, forecast_date, hour)
+                except Exception as e:
+                    logger.warning(f"Failed to send CloudWatch metric: {str(e)}")
 
     # Write location_dim and download_time_dim data to S3 raw bucket
     try:
-        s3.put_object(
-            Bucket=raw_bucket,
-            Key=f"forecast_data/location_dim/{location_data['location_id']}.json",
-            Body=json.dumps(location_data, sort_keys=True)
+        dims.put(
+            f"forecast_data/location_dim/{location_data['location_id']}.json",
+            json.dumps(location_data, sort_keys=True)
         )
-        s3.put_object(
-            Bucket=raw_bucket,
-            Key=f"forecast_data/download_time_dim/{download_time_data['download_time_id']}.json",
-            Body=json.dumps(download_time_data, sort_keys=True)
+        dims.put(
+            f"forecast_data/download_time_dim/{download_time_data['download_time_id']}.json",
+            json.dumps(download_time_data, sort_keys=True)
         )
     except Exception as e:
         return {
             "statusCode": 500,
             "body": json.dumps({"error": f"S3 write failed for dimension data: {str(e)}"})
         }
+    dims.flush()
 
     # Write forecast_fact data to S3 raw bucket
     try:
         for record in forecast_records:
-            s3.put_object(
-                Bucket=raw_bucket,
-                Key=f"forecast_data/forecast_fact/{record['forecast_id']}.json",
-                Body=json.dumps(record, sort_keys=True)
+            codec.put_object(
+                s3,
+                raw_bucket,
+                f"forecast_data/forecast_fact/{record['forecast_id']}.json",
+                json.dumps(record, sort_keys=True)
             )
     except Exception as e:
         return {
@@ -3,16 +3,18 @@ import pandas as pd
 import json
 import os
 from datetime import datetime, timezone
-from io import StringIO
 import logging
+import tracing
+import codec
+import schema
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Variables
-s3          = boto3.client("s3")
-cloudwatch  = boto3.client("cloudwatch")
+s3          = tracing.instrument_client(boto3.client("s3"))
+cloudwatch  = tracing.instrument_client(boto3.client("cloudwatch"))
 RAW_BUCKET  = os.environ["RAW_BUCKET"]
 city        = "Samsamso Ecofarm"
 
@@ -83,11 +85,15 @@ def read_csv_from_s3(bucket: str, prefix: str):
     frames = []
     for obj in response["Contents"]:
         key = obj["Key"]
-        if not key.endswith(".csv"):
+        if not codec.strip_suffix(key).endswith(".csv"):
             continue
         csv_obj = s3.get_object(Bucket=bucket, Key=key)
-        body = csv_obj["Body"].read().decode("utf-8")
-        df = pd.read_csv(StringIO(body))
+        # Decompressed while pandas reads it; nothing is buffered as one string
+        with tracing.span("parse", nbytes=csv_obj.get("ContentLength", 0)) as sp:
+            df = pd.read_csv(codec.open_body(csv_obj, key), encoding="utf-8")
+            # Sensor CSVs carry fact and time dimension columns; compact dtypes from common/schema.py
+            df = schema.apply(df, "solar_fact", "water_level_fact", "solar_time_dim")
+            sp["count"] += len(df)
         frames.append(df)
 
     if frames:
@@ -191,11 +197,13 @@ def write_json_lines_to_s3(bucket: str, prefix: str, records: list):
 
     timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
     key = f"{prefix}{timestamp}.json"
-    body = "\n".join(json.dumps(r) for r in records)
-    s3.put_object(Bucket=bucket, Key=key, Body=body.encode("utf-8"))
+    with tracing.span("serialize", count=len(records)):
+        body = "\n".join(json.dumps(r) for r in records)
+    key = codec.put_object(s3, bucket, key, body)
     logger.info(f"Wrote {len(records)} records to s3://{bucket}/{key}")
 
 
+@tracing.traced("measure_ingest")
 def lambda_handler(event, context):
     """Main Lambda entry point."""
     logger.info("Starting measurement ingestion...")
@@ -212,14 +220,16 @@ def lambda_handler(event, context):
 
     # Process solar data
     logger.info("Processing solar data")
-    solar_fact, solar_time, last_solar_id = process_solar_data(solar_df, last_solar_id)
+    with tracing.span("transform", count=len(solar_df)):
+        solar_fact, solar_time, last_solar_id = process_solar_data(solar_df, last_solar_id)
     write_json_lines_to_s3(RAW_BUCKET, SOLAR_FACT_PATH, solar_fact)
     write_json_lines_to_s3(RAW_BUCKET, SOLAR_TIME_DIM_PATH, solar_time)
     update_last_id(RAW_BUCKET, SOLAR_META_PATH, last_solar_id)
 
     # Process rainfall data
     logger.info("Processing rainfall data")
-    water_fact, water_time, last_water_id = process_water_data(water_df, last_water_id)
+    with tracing.span("transform", count=len(water_df)):
+        water_fact, water_time, last_water_id = process_water_data(water_df, last_water_id)
     write_json_lines_to_s3(RAW_BUCKET, WATER_FACT_PATH, water_fact)
     write_json_lines_to_s3(RAW_BUCKET, WATER_TIME_DIM_PATH, water_time)
     update_last_id(RAW_BUCKET, WATER_META_PATH, last_water_id)
@@ -0,0 +1,202 @@
+# /scripts/accuracy.py: forecast-vs-measured accuracy table, maintained incrementally by forecast_etl.py
+#
+# Layout in PROC_BUCKET:
+#   forecast_accuracy/forecasts/date=YYYY-MM-DD/forecasts.json   every issued forecast per (location_key, hour, issued_at)
+#   forecast_accuracy/detail/date=YYYY-MM-DD/accuracy.json       one row per measured (location_key, hour)
+#   forecast_accuracy/summary/summary.json                       error sums per (date, lead_hours)
+#   forecast_accuracy/by_lead/by_lead.json                       bias / MAE / RMSE per lead_hours
+#
+# Measurements are matched to the latest forecast for the same location and hour that was
+# issued at or before the measured hour (sorted as-of join). Only the dates of hours
+# measured in this run are read and rewritten.
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import tracing
+from rollups import facts_with_hour, location_key, read_partition, time_id_to_datetime, write_partition
+
+logger = logging.getLogger()
+
+ACCURACY_PREFIX = "forecast_accuracy"
+
+# Locations are matched by rollups.location_key (ACCURACY_LOCATION_MAP)
+
+# Measured panel kWh per forecast kWh/m2 of irradiation (panel area x efficiency)
+SOLAR_KWH_PER_KWH_M2 = float(os.environ.get("SOLAR_KWH_PER_KWH_M2", "1.0"))
+
+ACCURACY_COLUMNS = {
+    "forecast_data/forecast_fact/": ["location_id", "time_id", "rain_mm", "solarradiation_w", "issued_at"],
+    "forecast_data/forecast_time_dim/": ["forecast_time_id", "time_id"],
+    "measured_data/solar_fact/": ["location_id", "energy_time_id", "solarenergy_kwh"],
+    "measured_data/solar_time_dim/": ["solar_energy_time_id", "time_id"],
+    "measured_data/water_level_fact/": ["location_id", "level_time_id", "rain_collected_mm"],
+    "measured_data/water_level_time_dim/": ["water_level_time_id", "time_id"],
+}
+
+KEYS = ["location_key", "time_id"]
+ERROR_COLUMNS = {"rain": "rain_error_mm", "solar": "solar_error_kwh"}
+
+
+def new_forecasts(parts):
+    forecasts = facts_with_hour(parts, "forecast_data/forecast_fact/")
+    if forecasts is None or "issued_at" not in forecasts.columns:
+        return None
+    out = pd.DataFrame({
+        "location_key": location_key(forecasts["location_id"]),
+        "time_id": forecasts["time_id"],
+        "issued_at": pd.to_datetime(forecasts["issued_at"], utc=True),
+        "forecast_rain_mm": forecasts["rain_mm"],
+        "forecast_solar_kwh": forecasts["solarradiation_w"] / 1000 * SOLAR_KWH_PER_KWH_M2,
+    })
+    return out.drop_duplicates(KEYS + ["issued_at"], keep="last")
+
+
+def new_measurements(parts):
+    frames = []
+    for prefix, column, name in [
+        ("measured_data/solar_fact/", "solarenergy_kwh", "measured_solar_kwh"),
+        ("measured_data/water_level_fact/", "rain_collected_mm", "measured_rain_mm"),
+    ]:
+        facts = facts_with_hour(parts, prefix)
+        if facts is None:
+            continue
+        frame = pd.DataFrame({"location_key": location_key(facts["location_id"]), "time_id": facts["time_id"], name: facts[column]})
+        frames.append(frame.drop_duplicates(KEYS, keep="last").set_index(KEYS))
+    if not frames:
+        return None
+    measured = frames[0]
+    for frame in frames[1:]:
+        measured = measured.combine_first(frame)
+    return measured.reset_index()
+
+
+def partition_key(kind, day, name):
+    return f"{ACCURACY_PREFIX}/{kind}/date={day}/{name}.json"
+
+
+def with_dates(df):
+    df["date"] = time_id_to_datetime(df["time_id"]).dt.strftime("%Y-%m-%d")
+    return df
+
+
+def append_forecasts(s3, bucket, forecasts):
+    """Add new forecast issues to the per-date forecast history; returns {date: history}."""
+    history = {}
+    for day, rows in with_dates(forecasts).groupby("date"):
+        rows = rows.drop(columns=["date"])
+        existing = read_partition(s3, bucket, partition_key("forecasts", day, "forecasts"))
+        if existing is not None:
+            existing["issued_at"] = pd.to_datetime(existing["issued_at"], utc=True)
+            rows = pd.concat([existing, rows], ignore_index=True).drop_duplicates(KEYS + ["issued_at"], keep="last")
+        rows = rows.sort_values("issued_at")
+        write_partition(s3, bucket, partition_key("forecasts", day, "forecasts"), rows)
+        history[day] = rows
+    return history
+
+
+def match_forecasts(measured, history):
+    """As-of join: latest forecast for the same (location_key, time_id) issued at or before the hour."""
+    measured = measured.copy()
+    measured["measured_at"] = time_id_to_datetime(measured["time_id"])
+    measured = measured.sort_values("measured_at")
+    if history is None or history.empty:
+        matched = measured.assign(
+            issued_at=pd.Series(pd.NaT, index=measured.index, dtype="datetime64[ns, UTC]"),
+            forecast_rain_mm=np.nan,
+            forecast_solar_kwh=np.nan,
+        )
+    else:
+        history = history.astype({"location_key": "int64", "time_id": "int64"}).sort_values("issued_at")
+        matched = pd.merge_asof(
+            measured,
+            history,
+            left_on="measured_at",
+            right_on="issued_at",
+            by=KEYS,
+            direction="backward",
+        )
+    matched["lead_hours"] = np.floor((matched["measured_at"] - matched["issued_at"]).dt.total_seconds() / 3600)
+    for col in ["forecast_rain_mm", "forecast_solar_kwh", "measured_rain_mm", "measured_solar_kwh"]:
+        if col not in matched.columns:
+            matched[col] = np.nan
+    matched["rain_error_mm"] = matched["forecast_rain_mm"] - matched["measured_rain_mm"]
+    matched["solar_error_kwh"] = matched["forecast_solar_kwh"] - matched["measured_solar_kwh"]
+    return matched.drop(columns=["measured_at"])
+
+
+def summarize(detail, day):
+    """Error sums per lead_hours for one date; mergeable across dates."""
+    rows = detail.dropna(subset=["lead_hours"])
+    out = []
+    for lead, group in rows.groupby("lead_hours"):
+        row = {"date": day, "lead_hours": int(lead)}
+        for name, col in ERROR_COLUMNS.items():
+            err = group[col].dropna()
+            row[f"{name}_n"] = int(len(err))
+            row[f"{name}_sum_error"] = float(err.sum())
+            row[f"{name}_sum_abs_error"] = float(err.abs().sum())
+            row[f"{name}_sum_sq_error"] = float((err ** 2).sum())
+        out.append(row)
+    return pd.DataFrame(out)
+
+
+def by_lead(summary):
+    totals = summary.drop(columns=["date"]).groupby("lead_hours").sum().reset_index()
+    out = totals[["lead_hours"]].copy()
+    for name in ERROR_COLUMNS:
+        n = totals[f"{name}_n"].replace(0, np.nan)
+        out[f"{name}_n"] = totals[f"{name}_n"]
+        out[f"{name}_bias"] = totals[f"{name}_sum_error"] / n
+        out[f"{name}_mae"] = totals[f"{name}_sum_abs_error"] / n
+        out[f"{name}_rmse"] = np.sqrt(totals[f"{name}_sum_sq_error"] / n)
+    return out
+
+
+def update_accuracy(s3, bucket, parts):
+    """Record this run's forecast issues and score the hours measured in this run."""
+    with tracing.span("accuracy") as sp:
+        forecasts = new_forecasts(parts)
+        history = append_forecasts(s3, bucket, forecasts) if forecasts is not None and not forecasts.empty else {}
+
+        measured = new_measurements(parts)
+        if measured is None or measured.empty:
+            logger.info("[accuracy] No new measured hours; accuracy table unchanged.")
+            return
+
+        summaries = []
+        touched_days = []
+        for day, rows in with_dates(measured).groupby("date"):
+            rows = rows.drop(columns=["date"])
+            day_history = history.get(day)
+            if day_history is None:
+                day_history = read_partition(s3, bucket, partition_key("forecasts", day, "forecasts"))
+                if day_history is not None:
+                    day_history["issued_at"] = pd.to_datetime(day_history["issued_at"], utc=True)
+
+            # New measured values win; keep the other measure from earlier runs
+            existing = read_partition(s3, bucket, partition_key("detail", day, "accuracy"))
+            if existing is not None:
+                keep = [c for c in existing.columns if c in KEYS + ["measured_rain_mm", "measured_solar_kwh"]]
+                rows = rows.set_index(KEYS).combine_first(existing[keep].set_index(KEYS)).reset_index()
+
+            detail = match_forecasts(rows, day_history).sort_values(KEYS)
+            write_partition(s3, bucket, partition_key("detail", day, "accuracy"), detail)
+            summaries.append(summarize(detail, day))
+            touched_days.append(day)
+            sp["count"] += len(detail)
+
+        # Replace the summary rows of touched dates, then recompute the per-lead totals
+        summary_key = f"{ACCURACY_PREFIX}/summary/summary.json"
+        summary = read_partition(s3, bucket, summary_key)
+        if summary is not None:
+            summary = summary[~summary["date"].astype(str).isin(touched_days)]
+        frames = [f for f in [summary, *summaries] if f is not None and not f.empty]
+        if not frames:
+            logger.info("[accuracy] No measured hours matched a forecast yet.")
+            return
+        summary = pd.concat(frames, ignore_index=True).sort_values(["date", "lead_hours"])
+        write_partition(s3, bucket, summary_key, summary)
+        write_partition(s3, bucket, f"{ACCURACY_PREFIX}/by_lead/by_lead.json", by_lead(summary))
+        logger.info(f"[accuracy] Scored {sp['count']} measured hours over {len(touched_days)} dates")
@@ -0,0 +1,116 @@
+# /scripts/forecast_dedup.py: latest-forecast-wins upsert of forecast_fact, maintained by forecast_etl.py
+#
+# Every api_ingest run issues a new forecast_fact row per forecast hour, so the per-run
+# forecast_fact outputs pile up superseded forecasts. This keeps, per (location_key, hour),
+# only the latest FORECAST_HISTORY_ISSUES issues (issue_rank 1 = current forecast):
+#   forecast_data/forecast_fact_latest/date=YYYY-MM-DD/forecast_fact_latest.json
+#   indexes/forecast_fact_latest.json    (location_key, time_id) -> latest issued_at and partition date
+#
+# location_key is the canonical location of rollups.py (ACCURACY_LOCATION_MAP), so forecasts
+# fetched under different location ids of the same site dedupe together; rows keep their own location_id.
+#
+# The key index decides which partitions a run touches without listing or reading the table:
+# only dates holding a key with a newer issue than the index are rewritten. A replay (replay.py)
+# re-issues rows with their original issued_at, so it passes replace=True to let equal issues overwrite.
+import logging
+import os
+
+import pandas as pd
+import tracing
+from rollups import facts_with_hour, location_key, read_partition, time_id_to_datetime, write_partition
+
+logger = logging.getLogger()
+
+LATEST_PREFIX = "forecast_data/forecast_fact_latest"
+INDEX_KEY = "indexes/forecast_fact_latest.json"
+FORECAST_HISTORY_ISSUES = int(os.environ.get("FORECAST_HISTORY_ISSUES", "1"))
+
+FORECAST_FACT_COLUMNS = [
+    "forecast_id", "location_id", "time_id", "temperature_c", "rain_mm", "solarradiation_w",
+    "cloudcover", "wind_speed_kmh", "humidity", "weather_condition", "issued_at",
+]
+DEDUP_COLUMNS = {
+    "forecast_data/forecast_fact/": FORECAST_FACT_COLUMNS,
+    "forecast_data/forecast_time_dim/": ["forecast_time_id", "time_id"],
+}
+KEYS = ["location_key", "time_id"]
+
+
+def partition_key(day):
+    return f"{LATEST_PREFIX}/date={day}/forecast_fact_latest.json"
+
+
+def new_issues(parts):
+    """This run's forecasts keyed by canonical location and YYYYMMDDHH hour."""
+    facts = parts.get("forecast_data/forecast_fact/")
+    if facts is None or "issued_at" not in facts.columns:
+        return None
+    # keep the raw (hash) forecast_time_id next to the resolved hour
+    facts = facts.assign(raw_time_id=facts["time_id"])
+    forecasts = facts_with_hour({**parts, "forecast_data/forecast_fact/": facts}, "forecast_data/forecast_fact/")
+    if forecasts is None or forecasts.empty:
+        return None
+    forecasts = forecasts.rename(columns={"raw_time_id": "forecast_time_id"})
+    forecasts["location_key"] = location_key(forecasts["location_id"])
+    forecasts["issued_at"] = pd.to_datetime(forecasts["issued_at"], utc=True)
+    return forecasts.drop_duplicates(KEYS + ["issued_at"], keep="last")
+
+
+def load_index(s3, bucket):
+    index = read_partition(s3, bucket, INDEX_KEY)
+    if index is None:
+        return pd.DataFrame({"location_key": pd.Series(dtype="int64"), "time_id": pd.Series(dtype="int64"),
+                             "latest_issued_at": pd.Series(dtype="datetime64[ns, UTC]"), "date": pd.Series(dtype="object")})
+    index["latest_issued_at"] = pd.to_datetime(index["latest_issued_at"], utc=True)
+    return index.astype({"location_key": "int64", "time_id": "int64"})
+
+
+def keep_latest(rows):
+    """Keep the newest FORECAST_HISTORY_ISSUES issues per key and rank them (1 = latest)."""
+    rows = rows.sort_values("issued_at", ascending=False)
+    rows["issue_rank"] = rows.groupby(KEYS).cumcount() + 1
+    rows = rows[rows["issue_rank"] <= FORECAST_HISTORY_ISSUES]
+    order = [c for c in FORECAST_FACT_COLUMNS + ["location_key", "forecast_time_id", "issue_rank"] if c in rows.columns]
+    return rows[order].sort_values(KEYS + ["issue_rank"])
+
+
+def upsert_latest_forecasts(s3, bucket, parts, replace=False):
+    """
+    Merge this run's forecast issues into forecast_fact_latest, touching only affected partitions.
+    replace=True also rewrites keys whose latest issue equals the run's (corrected rows of a replay).
+    """
+    with tracing.span("dedup") as sp:
+        issues = new_issues(parts)
+        if issues is None or issues.empty:
+            logger.info("[dedup] No new forecast issues.")
+            return
+
+        index = load_index(s3, bucket)
+        newest = issues.groupby(KEYS, as_index=False)["issued_at"].max()
+        merged = newest.merge(index, on=KEYS, how="left")
+        # Keys with a newer issue than the index (or an equal one when replacing); older (late) issues never change the table
+        newer = merged["issued_at"] >= merged["latest_issued_at"] if replace else merged["issued_at"] > merged["latest_issued_at"]
+        changed = merged[merged["latest_issued_at"].isna() | newer]
+        if changed.empty:
+            logger.info("[dedup] All forecast issues in this run are already superseded.")
+            return
+        changed = changed[KEYS].assign(date=time_id_to_datetime(changed["time_id"]).dt.strftime("%Y-%m-%d"))
+        issues = issues.merge(changed, on=KEYS, how="inner")
+
+        for day, rows in issues.groupby("date"):
+            rows = rows.drop(columns=["date"])
+            existing = read_partition(s3, bucket, partition_key(day))
+            if existing is not None:
+                existing["issued_at"] = pd.to_datetime(existing["issued_at"], utc=True)
+                rows = pd.concat([existing.drop(columns=["issue_rank"], errors="ignore"), rows], ignore_index=True)
+                rows = rows.drop_duplicates(KEYS + ["issued_at"], keep="last")
+            latest = keep_latest(rows)
+            write_partition(s3, bucket, partition_key(day), latest)
+            sp["count"] += len(latest)
+
+        # Update the key index with the new latest issue per changed key
+        updates = newest.merge(changed, on=KEYS, how="inner").rename(columns={"issued_at": "latest_issued_at"})
+        index = pd.concat([index.merge(changed[KEYS], on=KEYS, how="left", indicator=True)
+                           .query("_merge == 'left_only'").drop(columns=["_merge"]), updates], ignore_index=True)
+        write_partition(s3, bucket, INDEX_KEY, index.sort_values(KEYS))
+        logger.info(f"[dedup] Updated {len(changed)} forecast keys in {changed['date'].nunique()} partitions")
@@ -1,9 +1,19 @@
 import boto3
 import pandas as pd
+import tracing
+import codec
+import schema
+import rollups
+import accuracy
+import forecast_dedup
+import time_dim_gen
 import os
 import sys
 import json
 import logging
+import multiprocessing as mp
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from io import StringIO
 from datetime import datetime, timezone
 from awsglue.utils import getResolvedOptions
@@ -13,11 +23,70 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Variables
-s3 = boto3.client("s3")
+s3 = tracing.instrument_client(boto3.client("s3"))
 args = getResolvedOptions(sys.argv, ["RAW_BUCKET", "PROC_BUCKET"])
 RAW_BUCKET = args["RAW_BUCKET"]
 PROC_BUCKET = args["PROC_BUCKET"]
-CHECKPOINT_FILE = os.environ.get("CHECKPOINT_FILE", "checkpoints/forecast_etl.json")
+
+# Optional job arguments; getResolvedOptions fails on absent names, so only resolve the ones passed.
+# Glue jobs cannot set environment variables, so the toggles are job arguments (see "3 1 4 glue.tf");
+# outside Glue the environment variable of the same name is the default.
+OPTIONAL_ARGS = {
+    "ETL_MODE": "full", "SHARD_PREFIXES": "all", "SHARD_INDEX": "0", "SHARD_COUNT": "1", "RUN_ID": "",
+    "CHECKPOINT_FILE": "checkpoints/forecast_etl.json",
+    "ETL_WORKERS": str(os.cpu_count() or 1),
+    "ETL_STREAMING": "false",
+    "STREAM_BATCH_FILES": "100",
+    "STREAM_PART_BYTES": str(8 * 1024 * 1024),
+    "ETL_ROLLUPS": "true",
+    "ETL_ACCURACY": "true",
+    "ACCURACY_LOCATION_MAP": json.dumps(rollups.ACCURACY_LOCATION_MAP),
+    "SOLAR_KWH_PER_KWH_M2": str(accuracy.SOLAR_KWH_PER_KWH_M2),
+    "ETL_FORECAST_DEDUP": "true",
+    "FORECAST_HISTORY_ISSUES": str(forecast_dedup.FORECAST_HISTORY_ISSUES),
+    "S3_CODEC": codec.S3_CODEC,
+    "TRACE_PROFILE": str(tracing.TRACE_PROFILE).lower(),
+    "TRACE_PROFILE_BUCKET": tracing.TRACE_PROFILE_BUCKET or "",
+}
+_passed = [name for name in OPTIONAL_ARGS if f"--{name}" in sys.argv]
+opts = {name: os.environ.get(name, default) for name, default in OPTIONAL_ARGS.items()}
+opts.update(getResolvedOptions(sys.argv, _passed) if _passed else {})
+# full: one monolithic run; shard: process one slice and stage its results; merge: combine the staged shards of RUN_ID
+ETL_MODE = opts["ETL_MODE"].lower()
+SHARD_INDEX = int(opts["SHARD_INDEX"])
+SHARD_COUNT = int(opts["SHARD_COUNT"])
+RUN_ID = opts["RUN_ID"] or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+if ETL_MODE not in ("full", "shard", "merge"):
+    raise ValueError(f"ETL_MODE must be full, shard or merge, got {ETL_MODE!r}")
+if not 0 <= SHARD_INDEX < SHARD_COUNT:
+    raise ValueError(f"SHARD_INDEX must be in [0, SHARD_COUNT), got {SHARD_INDEX}/{SHARD_COUNT}")
+if SHARD_COUNT > 1 and ETL_MODE != "shard":
+    # Only shard runs list a key-hash slice; a full or merge run must see every file
+    raise ValueError(f"SHARD_COUNT > 1 needs ETL_MODE=shard, got ETL_MODE={ETL_MODE!r} with SHARD_COUNT={SHARD_COUNT}")
+CHECKPOINT_FILE = opts["CHECKPOINT_FILE"]
+ETL_WORKERS = int(opts["ETL_WORKERS"])
+# Streaming mode: transform files in batches and append them to a multipart upload
+ETL_STREAMING = opts["ETL_STREAMING"].lower() == "true"
+STREAM_BATCH_FILES = int(opts["STREAM_BATCH_FILES"])
+STREAM_PART_BYTES = int(opts["STREAM_PART_BYTES"])  # S3 minimum part size is 5 MiB
+# Maintain daily/weekly rollups (see rollups.py) from the new data of each run
+ETL_ROLLUPS = opts["ETL_ROLLUPS"].lower() == "true"
+# Maintain the forecast-vs-measured accuracy table (see accuracy.py)
+ETL_ACCURACY = opts["ETL_ACCURACY"].lower() == "true"
+# location_id -> canonical location_key of the derived tables (rollups.py) and the solar kWh factor (accuracy.py)
+rollups.ACCURACY_LOCATION_MAP = json.loads(opts["ACCURACY_LOCATION_MAP"])
+accuracy.SOLAR_KWH_PER_KWH_M2 = float(opts["SOLAR_KWH_PER_KWH_M2"])
+# Keep only the latest forecast per location and hour in forecast_fact_latest (see forecast_dedup.py)
+ETL_FORECAST_DEDUP = opts["ETL_FORECAST_DEDUP"].lower() == "true"
+# Issues kept per location and hour in forecast_fact_latest (issue_rank 1..N)
+forecast_dedup.FORECAST_HISTORY_ISSUES = int(opts["FORECAST_HISTORY_ISSUES"])
+if forecast_dedup.FORECAST_HISTORY_ISSUES < 1:
+    raise ValueError(f"FORECAST_HISTORY_ISSUES must be at least 1, got {forecast_dedup.FORECAST_HISTORY_ISSUES}")
+# Compression of everything this job writes (common/codec.py); fails here on an unknown or unavailable codec
+codec.S3_CODEC = codec.resolve(opts["S3_CODEC"])
+# cProfile the run (and its prefix workers) into TRACE_PROFILE_BUCKET/profiles/ (common/tracing.py)
+tracing.TRACE_PROFILE = opts["TRACE_PROFILE"].lower() == "true"
+tracing.TRACE_PROFILE_BUCKET = opts["TRACE_PROFILE_BUCKET"] or None
 
   # Known raw data prefixes
 RAW_PREFIXES = [
@@ -32,12 +101,35 @@ RAW_PREFIXES = [
     "measured_data/water_level_time_dim/"
 ]
 
-TIME_DIM_KEY = "forecast_data/time_dim/time_dim.json"
+# Prefix subset of this run (--SHARD_PREFIXES comma-separated, default all)
+if opts["SHARD_PREFIXES"].lower() in ("", "all"):
+    ETL_PREFIXES = RAW_PREFIXES
+else:
+    ETL_PREFIXES = [p.strip().rstrip("/") + "/" for p in opts["SHARD_PREFIXES"].split(",") if p.strip()]
+    unknown = sorted(set(ETL_PREFIXES) - set(RAW_PREFIXES))
+    if unknown:
+        raise ValueError(f"Unknown SHARD_PREFIXES {unknown}; expected a subset of {RAW_PREFIXES}")
+
+TIME_DIM_KEY = time_dim_gen.TIME_DIM_KEY
+# Staged run state per RUN_ID: shard manifests and run slices (shards, streaming batches), removed once applied
+SHARD_STATE_PREFIX = "checkpoints/forecast_etl_shards"
+FORECAST_FACT_PREFIX = "forecast_data/forecast_fact/"
+
+# --- Shard helpers ---
+def shard_name(index=SHARD_INDEX, count=SHARD_COUNT):
+    return f"shard-{index}-of-{count}"
+
+def in_shard(key):
+    """Stable key-hash slice: every key belongs to exactly one of SHARD_COUNT shards."""
+    return zlib.crc32(key.encode("utf-8")) % SHARD_COUNT == SHARD_INDEX
+
+def shard_checkpoint_key(index=SHARD_INDEX, count=SHARD_COUNT):
+    return f"{CHECKPOINT_FILE.removesuffix('.json')}/{shard_name(index, count)}.json"
 
 # --- Checkpoint helpers ---
-def load_checkpoint():
+def load_checkpoint(key=CHECKPOINT_FILE):
     try:
-        obj = s3.get_object(Bucket=PROC_BUCKET, Key=CHECKPOINT_FILE)
+        obj = s3.get_object(Bucket=PROC_BUCKET, Key=key)
         checkpoint = json.loads(obj["Body"].read().decode("utf-8"))
         logger.info(f"Loaded checkpoint: {checkpoint}")
         return checkpoint
@@ -48,10 +140,10 @@ def load_checkpoint():
         logger.warning(f"Could not load checkpoint: {e}")
         return {}
 
-def save_checkpoint(checkpoint_data):
+def save_checkpoint(checkpoint_data, key=CHECKPOINT_FILE):
     s3.put_object(
         Bucket=PROC_BUCKET,
-        Key=CHECKPOINT_FILE,
+        Key=key,
         Body=json.dumps(checkpoint_data, sort_keys=True).encode("utf-8"),
     )
     logger.info(f"Saved checkpoint: {checkpoint_data}")
@@ -66,6 +158,8 @@ def list_new_files(prefix, last_checkpoint):
         for obj in page.get("Contents", []):
             key = obj["Key"]
             last_modified = obj["LastModified"].isoformat()
+            if SHARD_COUNT > 1 and not in_shard(key):
+                continue
             if prefix not in last_checkpoint or last_modified > last_checkpoint[prefix]:
                 new_files.append((key, last_modified))
     logger.info(f"[{prefix}] Found {len(new_files)} new files")
@@ -76,7 +170,20 @@ def process_file(key):
     """Download and return the file content as a DataFrame (handles array, NDJSON, or single object)."""
     logger.info(f"Downloading {key} from {RAW_BUCKET}")
     obj = s3.get_object(Bucket=RAW_BUCKET, Key=key)
-    body = obj["Body"].read().decode("utf-8")
+    body = codec.read_body(obj, key).decode("utf-8")
+    with tracing.span("parse", count=1, nbytes=len(body)):
+        df = parse_json_body(key, body)
+    before = len(df)
+    # remove rows that are all null
+    df = df.dropna(how="all")
+    after = len(df)
+    if before != after:
+        logger.info(f"[{key}] Dropped {before - after} all-null rows")
+    
+    return df
+
+def parse_json_body(key, body):
+    """Parse a raw body as JSON array, NDJSON, or single object into a DataFrame."""
     try:
         # First try: JSON array of objects
         df = pd.read_json(StringIO(body), lines=False)
@@ -95,14 +202,6 @@ def process_file(key):
             else:
                 logger.error(f"[{key}] Unsupported JSON format: {type(data)}")
                 raise
-
-    before = len(df)
-    # remove rows that are all null
-    df = df.dropna(how="all")
-    after = len(df)
-    if before != after:
-        logger.info(f"[{key}] Dropped {before - after} all-null rows")
-    
     return df
 
 # ---------- Add time_id column to time dimensions ---------- 
@@ -127,128 +226,542 @@ def add_time_id(df, prefix):
 # --- Load time_dim ---
 def load_existing_time_dim():
     try:
-        obj = s3.get_object(Bucket=PROC_BUCKET, Key=TIME_DIM_KEY)
-        time_dim = pd.read_json(StringIO(obj["Body"].read().decode("utf-8")), lines=True)
+        # Falls back to the uncompressed time_dim.json written before S3_CODEC
+        time_dim = schema.apply(pd.read_json(StringIO(codec.get_text_any(s3, PROC_BUCKET, TIME_DIM_KEY)), lines=True), "time_dim")
         logger.info(f"Loaded existing time_dim with {len(time_dim)} records")
     except s3.exceptions.NoSuchKey:
-        logger.info("No existing time_dim found; triggering Glue job to generate it...")
-        
-        glue = boto3.client("glue")
-        job_name = "generate-time-dim"
-        
-        try:
-            response = glue.start_job_run(JobName=job_name)
-            run_id = response["JobRunId"]
-            logger.info(f"Started Glue job '{job_name}' with run ID: {run_id}")
-            
-            # Optional: wait for the job to finish (synchronous wait)
-            waiter = glue.get_waiter("job_run_succeeded")
-            waiter.wait(JobName=job_name, RunId=run_id)
-            logger.info(f"Glue job '{job_name}' completed successfully.")
-            
-            # Once done, reload the time_dim
-            obj = s3.get_object(Bucket=PROC_BUCKET, Key=TIME_DIM_KEY)
-            time_dim = pd.read_json(StringIO(obj["Body"].read().decode("utf-8")), lines=True)
-            logger.info(f"loaded time_dim with {len(time_dim)} records")
-        
-        except Exception as e:
-            logger.error(f"Failed to trigger or complete Glue job: {e}", exc_info=True)
-            time_dim = pd.DataFrame(columns=["time_id", "datetime"])
+        # Generated in-process by run_etl (time_dim_gen.extend_time_dim); no generate-time-dim job to wait for
+        logger.info("No existing time_dim found; it will be generated in-process.")
+        time_dim = pd.DataFrame(columns=["time_id", "datetime"])
     return time_dim
 
 # --- Save time_dim as JSON ---
 def save_time_dim(time_dim):
-    s3.put_object(
-        Bucket=PROC_BUCKET,
-        Key=TIME_DIM_KEY,
-        Body=time_dim.to_json(orient="records", lines=True, date_format="iso").encode("utf-8")
-    )
+    # The crawler reads the whole folder: drop the copy under the previous codec
+    codec.replace_object(s3, PROC_BUCKET, TIME_DIM_KEY, time_dim.to_json(orient="records", lines=True, date_format="iso"))
     logger.info(f"Saved merged time_dim with {len(time_dim)} records")
 
+# --- Per-file transform ---
+def transform_file(key, prefix, last_modified=None):
+    """Download a raw file and cast its columns to match the Glue schema."""
+    df = process_file(key)
+
+    # Forecast rows carry no issue time; the raw object's write time is when api_ingest issued it
+    if prefix == FORECAST_FACT_PREFIX and last_modified is not None:
+        df["issued_at"] = pd.to_datetime(last_modified, utc=True)
+
+    with tracing.span("transform", count=len(df)):
+        # ---- 🔧 CAST TYPES TO MATCH GLUE SCHEMA (compact dtypes from common/schema.py) ----
+        df = add_time_id(df, prefix)
+        table = schema.table_of(prefix)
+        return schema.apply(df, table) if table else df
+
+def concat_frames(dfs, prefix):
+    """Concat per-file frames; categoricals with differing categories come out as strings and are re-applied."""
+    combined = pd.concat(dfs, ignore_index=True)
+    table = schema.table_of(prefix)
+    return schema.apply(combined, table) if table else combined
+
+# --- New time_dim rows from a time dimension prefix ---
+def extract_new_times(combined, prefix):
+    """Return the (time_id, datetime) rows a time dimension prefix contributes to time_dim, or None."""
+    if "time_dim" not in prefix or "time_id" not in combined.columns:
+        return None
+    new_times = combined[["time_id"]].copy()
+    if "datetime" in combined.columns:
+        new_times["datetime"] = combined["datetime"]
+    else:
+        # fallback: use whichever column generated time_id
+        time_col = next((c for c in combined.columns if c.lower() in ["timestamp", "datetime", "time", "date_time"]), None)
+        if time_col:
+            new_times["datetime"] = combined[time_col]
+    return new_times.drop_duplicates("time_id")
+
+def output_key(prefix):
+    """Output file per run per dimension."""
+      # !!! >= python 3.9 !!! added '.removeprefix('measured_data/')' for measured paths
+    name = prefix.removeprefix('forecast_data/').removeprefix('measured_data/').rstrip('/')
+    # shards of one run write in the same minute
+    shard = f"_{shard_name()}" if SHARD_COUNT > 1 else ""
+    return codec.encoded_key(f"{prefix.rstrip('/')}/{name}_{datetime.now(timezone.utc).strftime('%Y%m%d%H%M')}{shard}.json")
+
+# --- Lineage: raw LastModified range an output covers (used by replay.py to find superseded outputs) ---
+def lineage_metadata(files):
+    lms = [lm for _, lm in files]
+    return {"raw-lm-min": min(lms), "raw-lm-max": max(lms)}
+
+# --- Columns kept for the post-run rollup/accuracy steps ---
+def raw_lms(prefix, dfs, lms):
+    """Raw LastModified of every row of concat_frames(dfs) for a shard's fact slices, else None (see stage_shard_slice)."""
+    if ETL_MODE != "shard" or prefix not in rollups.FACT_TIME_DIMS:
+        return None
+    return pd.Series(lms).repeat([len(df) for df in dfs]).to_numpy()
+
+def derived_slice(prefix, df, raw_lm=None):
+    """Return the columns of a processed frame that the rollup/accuracy/dedup steps need, or None."""
+    cols = []
+    if ETL_ROLLUPS:
+        cols += rollups.ROLLUP_COLUMNS.get(prefix, [])
+    if ETL_ACCURACY:
+        cols += accuracy.ACCURACY_COLUMNS.get(prefix, [])
+    if ETL_FORECAST_DEDUP:
+        cols += forecast_dedup.DEDUP_COLUMNS.get(prefix, [])
+    cols = [c for c in dict.fromkeys(cols) if c in df.columns]
+    if not cols:
+        return None
+    run_slice = schema.output_frame(df[cols]).copy()
+    if raw_lm is not None:
+        run_slice["raw_lm"] = raw_lm
+    return run_slice
+
+def slice_name(prefix):
+    return prefix.rstrip("/").replace("/", "__")
+
+def stage_slice(run_slice, name):
+    """Write a run slice under this run's staged state; returns its key."""
+    return codec.put_object(
+        s3, PROC_BUCKET, shard_state_key(f"slices/{name}.json"),
+        run_slice.to_json(orient="records", lines=True, date_format="iso"),
+    )
+
+def stage_shard_slice(run_slice, name):
+    """
+    Stage a shard's run slice; returns its keys. Fact slices are split per raw LastModified day
+    ("<name>/lm-YYYY-MM-DD"), so run_merge can apply each day of all shards sorted by raw_lm.
+    """
+    if "raw_lm" not in run_slice.columns:
+        return [stage_slice(run_slice, name)]
+    return [stage_slice(rows, f"{name}/lm-{day}") for day, rows in run_slice.groupby(run_slice["raw_lm"].str[:10], sort=True)]
+
+def slice_window(key):
+    """Raw LastModified day of a staged shard fact slice, or None for other slices."""
+    _, sep, rest = key.rpartition("/lm-")
+    return rest[:10] if sep else None
+
+def load_slice(key):
+    text = codec.get_text(s3, PROC_BUCKET, key)
+    return pd.read_json(StringIO(text), lines=True, dtype=False, convert_dates=False, keep_default_dates=False)
+
+def delete_staged(keys):
+    for start in range(0, len(keys), 1000):
+        s3.delete_objects(Bucket=PROC_BUCKET, Delete={"Objects": [{"Key": k} for k in keys[start:start + 1000]]})
+
+# --- Multipart output writer for streaming mode ---
+class MultipartWriter:
+    """Compresses serialized NDJSON with S3_CODEC and uploads it as S3 multipart parts of STREAM_PART_BYTES."""
+
+    def __init__(self, bucket, key, metadata=None):
+        self.bucket = bucket
+        self.key = key
+        self.upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key, Metadata=metadata or {}, **codec.object_args())["UploadId"]
+        self.parts = []
+        self.buffer = bytearray()
+        # One compressed stream across all parts
+        self.compressor = codec.compressobj()
+
+    def write(self, data):
+        self.buffer += self.compressor.compress(data)
+        if len(self.buffer) >= STREAM_PART_BYTES:
+            self._flush()
+
+    def _flush(self):
+        part_number = len(self.parts) + 1
+        response = s3.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=bytes(self.buffer),
+        )
+        self.parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+        self.buffer = bytearray()
+
+    def close(self):
+        self.buffer += self.compressor.flush()
+        # Last part may be smaller than the S3 minimum
+        if self.buffer or not self.parts:
+            self._flush()
+        s3.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": self.parts},
+        )
+
+    def abort(self):
+        s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+def stream_prefix(prefix, new_files):
+    """
+    Transform new files in batches of STREAM_BATCH_FILES and append each batch to a
+    multipart upload, so memory stays bounded by one batch plus one part buffer.
+    Each batch's run slice is staged to S3 rather than kept (see derived_passes).
+    Returns (records_written, new_times, staged_slice_keys, failed_files).
+    """
+    out_key = output_key(prefix)
+    writer = MultipartWriter(PROC_BUCKET, out_key, lineage_metadata(new_files))
+    records = 0
+    failed = 0
+    new_times_parts = []
+    slice_keys = []
+    try:
+        for start in range(0, len(new_files), STREAM_BATCH_FILES):
+            dfs = []
+            lms = []
+            for key, lm in new_files[start:start + STREAM_BATCH_FILES]:
+                try:
+                    df = transform_file(key, prefix, lm)
+                    if df is not None and not df.empty:
+                        dfs.append(df)
+                        lms.append(lm)
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"[ERROR] Failed to process {key}: {e}", exc_info=True)
+            if not dfs:
+                continue
+
+            batch = concat_frames(dfs, prefix)
+            new_times = extract_new_times(batch, prefix)
+            if new_times is not None:
+                new_times_parts.append(new_times)
+            run_slice = derived_slice(prefix, batch, raw_lms(prefix, dfs, lms))
+            if run_slice is not None:
+                slice_keys += stage_shard_slice(run_slice, f"{shard_name()}/{slice_name(prefix)}/batch-{start // STREAM_BATCH_FILES:05d}")
+
+            with tracing.span("serialize", count=len(batch)) as sp:
+                body = schema.output_frame(batch).to_json(orient="records", lines=True, date_format="iso")
+                if not body.endswith("\n"):
+                    body += "\n"
+                sp["bytes"] += len(body)
+            writer.write(body.encode("utf-8"))
+            records += len(batch)
+            logger.info(f"[{prefix}] Streamed batch of {len(batch)} records ({records} total)")
+
+        if not records:
+            writer.abort()
+            return 0, None, None, failed
+        writer.close()
+    except Exception:
+        writer.abort()
+        delete_staged(slice_keys)
+        raise
+
+    logger.info(f"[INFO] Wrote processed file: {out_key} ({records} records, {len(writer.parts)} parts)")
+    new_times = pd.concat(new_times_parts, ignore_index=True).drop_duplicates("time_id") if new_times_parts else None
+    return records, new_times, slice_keys or None, failed
+
+# --- Prefix worker (runs in a pool process) ---
+def init_worker():
+    """boto3 clients are not fork-safe; give every pool process its own."""
+    global s3
+    s3 = tracing.instrument_client(boto3.client("s3"))
+
+@tracing.traced("forecast_etl.prefix")
+def process_prefix(prefix, checkpoint):
+    """
+    Process all new files under one prefix and write its output file.
+    Returns (prefix, latest_last_modified, new_times, run_slice, failed_files); latest_last_modified
+    is None when nothing was written, so the prefix's checkpoint must not move.
+    """
+    tracing.annotate(prefix=prefix)
+    logger.info(f"[INFO] Checking prefix: {prefix}")
+    new_files = list_new_files(prefix, checkpoint)
+
+    if not new_files:
+        logger.info(f"[INFO] No new files for prefix {prefix}")
+        return prefix, None, None, None, 0
+
+    # Oldest first, so later rows of the same key are the newest ones
+    new_files = sorted(new_files, key=lambda f: f[1])
+
+    if ETL_STREAMING:
+        records, new_times, run_slice, failed = stream_prefix(prefix, new_files)
+        if not records:
+            logger.warning(f"No valid dataframes for prefix {prefix}; nothing written.")
+            return prefix, None, None, None, failed
+        latest_lm = max([lm for _, lm in new_files])
+        return prefix, latest_lm, new_times, run_slice, failed
+
+    dfs = []
+    lms = []
+    failed = 0
+    for key, lm in new_files:
+        try:
+            df = transform_file(key, prefix, lm)
+            if df is not None and not df.empty:
+                dfs.append(df)
+                lms.append(lm)
+        except Exception as e:
+            failed += 1
+            logger.error(f"[ERROR] Failed to process {key}: {e}", exc_info=True)
+
+    if not dfs:
+        logger.warning(f"No valid dataframes for prefix {prefix}; skipping concat.")
+        return prefix, None, None, None, failed
+
+    combined = concat_frames(dfs, prefix)
+    new_times = extract_new_times(combined, prefix)
+
+    out_key = output_key(prefix)
+    with tracing.span("serialize", count=len(combined)) as sp:
+        body = schema.output_frame(combined).to_json(orient="records", lines=True, date_format="iso").encode("utf-8")
+        body = codec.compress(body)
+        sp["bytes"] += len(body)
+    s3.put_object(Bucket=PROC_BUCKET, Key=out_key, Body=body, Metadata=lineage_metadata(new_files), **codec.object_args())
+    logger.info(f"[INFO] Wrote processed file: {out_key} ({len(combined)} records)")
+
+    # Newest last_modified of this prefix, applied by the parent in one step
+    latest_lm = max([lm for _, lm in new_files])
+    run_slice = derived_slice(prefix, combined, raw_lms(prefix, dfs, lms))
+    return prefix, latest_lm, new_times, run_slice, failed
+
 # --- Main ETL ---
+def run_prefixes(prefixes, checkpoint):
+    """
+    Process prefixes in the pool. Returns (checkpoint_updates, new_times_parts, run_slices, complete);
+    a failed or empty prefix has no checkpoint update, so the next run retries it. complete holds
+    the prefixes whose listed files were all processed (or that had none).
+    """
+    updates = {}
+    new_times_parts = []
+    run_slices = {}
+    complete = set()
+    # Prefixes are independent: run each as its own task, bounded by the largest one
+    workers = max(1, min(ETL_WORKERS, len(prefixes)))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("fork"), initializer=init_worker) as pool:
+        futures = {pool.submit(process_prefix, prefix, checkpoint): prefix for prefix in prefixes}
+        for future in as_completed(futures):
+            prefix = futures[future]
+            try:
+                _, latest_lm, new_times, run_slice, failed = future.result()
+            except Exception as e:
+                # Checkpoint for this prefix stays where it was so the next run retries it
+                logger.error(f"[ERROR] Prefix {prefix} failed: {e}", exc_info=True)
+                continue
+            if not failed:
+                complete.add(prefix)
+            if latest_lm is None:
+                continue
+            if new_times is not None:
+                new_times_parts.append(new_times)
+                logger.info(f"[{prefix}] Merged {len(new_times)} new time_dim records.")
+            if run_slice is not None:
+                run_slices[prefix] = run_slice
+            updates[prefix] = latest_lm
+    return updates, new_times_parts, run_slices, complete
+
+def finish_run(time_dim_df, new_times_parts, run_slices, replay=False):
+    """
+    Extend time_dim and update the derived tables from the new data of a (full or merged) run.
+    replay=True (replay.py) lets replayed forecasts overwrite the latest ones they were issued as.
+    """
+    # --- Extend time_dim to the hours this run needs (rolling horizon); rewrite only when it grew ---
+    needed_ids = pd.concat([t["time_id"] for t in new_times_parts], ignore_index=True) if new_times_parts else None
+    time_dim_df, added = time_dim_gen.extend_time_dim(time_dim_df, needed_ids)
+    if added:
+        save_time_dim(time_dim_df)
+        logger.info(f"Updated time_dim saved ({added} new hours).")
+
+    if run_slices and (ETL_ROLLUPS or ETL_ACCURACY or ETL_FORECAST_DEDUP):
+        for parts in derived_passes(run_slices):
+            update_derived(parts, replay)
+
+def derived_passes(run_slices):
+    """
+    Yield the parts of each derived-table update. run_slices values are frames, or lists of keys of
+    slices staged to S3 (streaming batches, shard results); staged fact slices are applied one per
+    pass, forecasts before measurements, so memory stays bounded by one slice. Shard fact slices
+    are applied one raw LastModified day per pass, that day's rows of every shard sorted by raw_lm,
+    so newer values win as in a full run. Time dim slices are two columns and every pass resolves
+    its hours through them, so they are loaded whole.
+    """
+    frames = {}
+    batches = []
+    for prefix, run_slice in run_slices.items():
+        if isinstance(run_slice, pd.DataFrame):
+            frames[prefix] = run_slice
+        elif prefix in rollups.FACT_TIME_DIMS:
+            windows = {}
+            for key in run_slice:
+                window = slice_window(key)
+                if window is None:
+                    batches.append((prefix, [key]))
+                else:
+                    windows.setdefault(window, []).append(key)
+            batches += [(prefix, windows[window]) for window in sorted(windows)]
+        else:
+            frames[prefix] = pd.concat([load_slice(key) for key in run_slice], ignore_index=True)
+    dims = {p: f for p, f in frames.items() if p not in rollups.FACT_TIME_DIMS}
+    if len(dims) < len(frames) or not batches:
+        yield frames
+    # Stable sort: batches of a prefix stay oldest first
+    for prefix, keys in sorted(batches, key=lambda b: RAW_PREFIXES.index(b[0])):
+        batch = pd.concat([load_slice(key) for key in keys], ignore_index=True)
+        if "raw_lm" in batch.columns:
+            batch = batch.sort_values("raw_lm", kind="stable").drop(columns="raw_lm").reset_index(drop=True)
+        yield {**dims, prefix: batch}
+
+def update_derived(parts, replay=False):
+    """Apply one pass of run slices to the rollup, accuracy and forecast_fact_latest tables."""
+    # --- Facts whose time dim row came in an earlier run: resolve their hours from the stored index ---
+    try:
+        parts = rollups.with_stored_hours(s3, PROC_BUCKET, parts)
+    except Exception as e:
+        logger.error(f"[ERROR] Failed to resolve stored time dim hours: {e}", exc_info=True)
+
+    # --- Incremental daily/weekly rollups from this run's new data ---
+    if ETL_ROLLUPS:
+        try:
+            rollups.update_rollups(s3, PROC_BUCKET, parts)
+        except Exception as e:
+            logger.error(f"[ERROR] Failed to update rollups: {e}", exc_info=True)
+
+    # --- Forecast-vs-measured accuracy for the hours measured in this run ---
+    if ETL_ACCURACY:
+        try:
+            accuracy.update_accuracy(s3, PROC_BUCKET, parts)
+        except Exception as e:
+            logger.error(f"[ERROR] Failed to update forecast accuracy: {e}", exc_info=True)
+
+    # --- Latest-forecast-wins upsert of forecast_fact ---
+    if ETL_FORECAST_DEDUP:
+        try:
+            forecast_dedup.upsert_latest_forecasts(s3, PROC_BUCKET, parts, replace=replay)
+        except Exception as e:
+            logger.error(f"[ERROR] Failed to upsert latest forecasts: {e}", exc_info=True)
+
+@tracing.traced("forecast_etl")
 def run_etl():
     checkpoint = load_checkpoint()
-    new_checkpoint = checkpoint.copy()
 
     # --- Load time dimension ---
     time_dim_df = load_existing_time_dim()
-    
-    for prefix in RAW_PREFIXES:
-        logger.info(f"[INFO] Checking prefix: {prefix}")
-        new_files = list_new_files(prefix, checkpoint)
-
-        if not new_files:
-            logger.info(f"[INFO] No new files for prefix {prefix}")
-            continue
-        dfs = []
-        for key, lm in new_files:
-            try:
-                df = process_file(key)
-
-                 # ---- 🔧 CAST TYPES TO MATCH GLUE SCHEMA ----
-                if "time_id" in df.columns:
-                    df["time_id"] = pd.to_numeric(df["time_id"], errors="coerce").astype("Int64")
-
-                numeric_cols = ["year", "month", "day", "hour"]
-                for col in numeric_cols:
-                    if col in df.columns:
-                        df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
-        
-                if "is_weekend" in df.columns:
-                    df["is_weekend"] = df["is_weekend"].astype(bool)
-        
-                # Ensure datetime is actual datetime type
-                if "datetime" in df.columns:
-                    df["datetime"] = pd.to_datetime(df["datetime"], errors="coerce", utc=True)
-        
-                df = add_time_id(df, prefix)
-                dfs.append(df)
-        
-            except Exception as e:
-                logger.error(f"[ERROR] Failed to process {key}: {e}", exc_info=True)
 
-        if dfs:
-            dfs = [d for d in dfs if d is not None and not d.empty]
-            if not dfs:
-                logger.warning(f"No valid dataframes for prefix {prefix}; skipping concat.")
-                continue
+    updates, new_times_parts, run_slices, _ = run_prefixes(ETL_PREFIXES, checkpoint)
+    try:
+        finish_run(time_dim_df, new_times_parts, run_slices)
+    finally:
+        # Streaming batches staged their run slices
+        delete_staged([key for run_slice in run_slices.values() if isinstance(run_slice, list) for key in run_slice])
 
-            combined = pd.concat(dfs, ignore_index=True)
-            # --- CHANGED/NEW ---
-            if "time_dim" in prefix and "time_id" in combined.columns:
-                new_times = combined[["time_id"]].copy()
-                if "datetime" in combined.columns:
-                    new_times["datetime"] = combined["datetime"]
-                else:
-                    # fallback: use whichever column generated time_id
-                    time_col = next((c for c in combined.columns if c.lower() in ["timestamp", "datetime", "time", "date_time"]), None)
-                    if time_col:
-                        new_times["datetime"] = combined[time_col]
-                time_dim_df = pd.concat([time_dim_df, new_times], ignore_index=True).drop_duplicates("time_id")
-                logger.info(f"[{prefix}] Merged {len(new_times)} new time_dim records.")
+    save_checkpoint({**checkpoint, **updates})
+    logger.info("Checkpoint updated.")
 
+# --- Sharded runs: N x run_shard (e.g. a Step Functions Map state), then one run_merge ---
+def shard_state_key(name):
+    return f"{SHARD_STATE_PREFIX}/{RUN_ID}/{name}"
 
+@tracing.traced("forecast_etl.shard")
+def run_shard():
+    """Process this shard's slice and stage its results; time_dim, derived tables and the global checkpoint are left to run_merge."""
+    tracing.annotate(shard=shard_name(), run_id=RUN_ID)
+    # Own checkpoint per shard, never behind the global one (full runs may have moved it); only
+    # run_merge moves it, so the files of a run whose merge failed are processed again
+    global_checkpoint = load_checkpoint()
+    shard_checkpoint = load_checkpoint(shard_checkpoint_key())
+    checkpoint = {p: max(global_checkpoint.get(p, ""), shard_checkpoint.get(p, "")) for p in {*global_checkpoint, *shard_checkpoint}}
 
-            # Output file per run per dimension
-              # !!! >= python 3.9 !!! added '.removeprefix('measured_data/')' for measured paths
-            out_key = f"{prefix.rstrip('/')}/{prefix.removeprefix('forecast_data/').removeprefix('measured_data/').rstrip('/')}_{datetime.now(timezone.utc).strftime('%Y%m%d%H%M')}.json"
-            s3.put_object(
-                Bucket=PROC_BUCKET,
-                Key=out_key,
-                Body=combined.to_json(orient="records", lines=True, date_format="iso").encode("utf-8"),
-            )
-            logger.info(f"[INFO] Wrote processed file: {out_key} ({len(combined)} records)")
+    listed_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    updates, new_times_parts, run_slices, complete = run_prefixes(ETL_PREFIXES, checkpoint)
+    # A prefix whose listed files all succeeded is done up to the listing time, not just up to its
+    # newest file: the newest file of this slice can be older than another shard's, and run_merge
+    # takes the oldest position, so it would hold the prefix back and the next run would reprocess.
+    for prefix in complete:
+        updates[prefix] = max(checkpoint.get(prefix, ""), listed_at)
+    new_checkpoint = {**checkpoint, **updates}
 
-            # Update checkpoint with the newest last_modified
-            latest_lm = max([lm for _, lm in new_files])
-            new_checkpoint[prefix] = latest_lm
+    # prefix -> staged slice keys (streaming batches are staged already)
+    slice_keys = {}
+    for prefix, run_slice in run_slices.items():
+        if isinstance(run_slice, pd.DataFrame):
+            run_slice = stage_shard_slice(run_slice, f"{shard_name()}/{slice_name(prefix)}")
+        slice_keys[prefix] = run_slice
+    time_ids = sorted({int(t) for part in new_times_parts for t in part["time_id"].dropna()})
+    manifest = {
+        "shard_index": SHARD_INDEX,
+        "shard_count": SHARD_COUNT,
+        "prefixes": ETL_PREFIXES,
+        "listed_at": listed_at,
+        "checkpoint": {p: new_checkpoint[p] for p in ETL_PREFIXES if p in new_checkpoint},
+        "time_ids": time_ids,
+        "slices": slice_keys,
+    }
+    s3.put_object(Bucket=PROC_BUCKET, Key=shard_state_key(f"{shard_name()}.json"), Body=json.dumps(manifest).encode("utf-8"))
+    logger.info(f"[{shard_name()}] Staged {len(slice_keys)} run slices and {len(time_ids)} time ids for run {RUN_ID}")
 
-    if not time_dim_df.empty:
-        save_time_dim(time_dim_df)
-        logger.info("Updated time_dim saved.")
+def load_shard_manifests():
+    paginator = s3.get_paginator("list_objects_v2")
+    manifests = []
+    for page in paginator.paginate(Bucket=PROC_BUCKET, Prefix=shard_state_key("shard-")):
+        for obj in page.get("Contents", []):
+            manifests.append(json.loads(s3.get_object(Bucket=PROC_BUCKET, Key=obj["Key"])["Body"].read().decode("utf-8")))
+    return manifests
 
-    save_checkpoint(new_checkpoint)
-    logger.info("Checkpoint updated.")
+def delete_leftover_runs(listed_at):
+    """
+    Delete the staged state of other runs that ended before this run listed its files: their merge
+    failed, so their shard checkpoints never moved and this run processed their files again.
+    """
+    listed_at = datetime.fromisoformat(listed_at)
+    paginator = s3.get_paginator("list_objects_v2")
+    runs = {}
+    for page in paginator.paginate(Bucket=PROC_BUCKET, Prefix=f"{SHARD_STATE_PREFIX}/"):
+        for obj in page.get("Contents", []):
+            run_id = obj["Key"][len(SHARD_STATE_PREFIX) + 1:].split("/", 1)[0]
+            if run_id != RUN_ID:
+                keys, newest = runs.get(run_id, ([], obj["LastModified"]))
+                runs[run_id] = (keys + [obj["Key"]], max(newest, obj["LastModified"]))
+    for run_id, (keys, newest) in sorted(runs.items()):
+        if newest < listed_at:
+            delete_staged(keys)
+            logger.warning(f"Deleted {len(keys)} staged objects of unmerged run {run_id}")
+
+@tracing.traced("forecast_etl.merge")
+def run_merge():
+    """Combine the staged shards of RUN_ID: time_dim, derived tables and the global checkpoint."""
+    tracing.annotate(run_id=RUN_ID)
+    manifests = load_shard_manifests()
+    if not manifests:
+        logger.warning(f"No staged shards for run {RUN_ID}; nothing to merge.")
+        return
+    expected = manifests[0]["shard_count"]
+    found = sorted(m["shard_index"] for m in manifests)
+    if found != list(range(expected)):
+        # Merging part of the shards would move the global checkpoint past unprocessed files
+        raise RuntimeError(f"Run {RUN_ID} has shards {found} staged, expected 0..{expected - 1}")
+
+    new_times_parts = [pd.DataFrame({"time_id": m["time_ids"]}) for m in manifests if m["time_ids"]]
+    # Staged keys in shard order; derived_passes orders fact slices by raw LastModified
+    run_slices = {}
+    for m in manifests:
+        for prefix, keys in m["slices"].items():
+            run_slices.setdefault(prefix, []).extend(keys)
+
+    finish_run(load_existing_time_dim(), new_times_parts, run_slices)
+
+    # A prefix only moves to the oldest position its shards reached, so no shard's unprocessed files are skipped
+    checkpoint = load_checkpoint()
+    for prefix in {p for m in manifests for p in m["prefixes"]}:
+        positions = [m["checkpoint"].get(prefix, "") for m in manifests if prefix in m["prefixes"]]
+        checkpoint[prefix] = max(checkpoint.get(prefix, ""), min(positions))
+    checkpoint = {p: lm for p, lm in checkpoint.items() if lm}
+    save_checkpoint(checkpoint)
+    # Shard checkpoints move only now that the run is merged
+    for m in manifests:
+        key = shard_checkpoint_key(m["shard_index"], m["shard_count"])
+        save_checkpoint({**load_checkpoint(key), **m["checkpoint"]}, key)
+
+    # Staged state is only needed until the merge succeeded
+    staged = [key for m in manifests for keys in m["slices"].values() for key in keys]
+    staged += [shard_state_key(f"{shard_name(m['shard_index'], m['shard_count'])}.json") for m in manifests]
+    delete_staged(staged)
+    delete_leftover_runs(min(m["listed_at"] for m in manifests))
+    logger.info(f"Merged {len(manifests)} shards of run {RUN_ID}; checkpoint updated.")
 
 if __name__ == "__main__":
-    run_etl()
+    if ETL_MODE == "shard":
+        run_shard()
+    elif ETL_MODE == "merge":
+        run_merge()
+    else:
+        run_etl()
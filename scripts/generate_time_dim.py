@@ -1,7 +1,9 @@
 import pandas as pd
 import boto3
-from datetime import datetime
 import logging
+import time_dim_gen
+import codec
+from io import StringIO
 from awsglue.utils import getResolvedOptions
 import sys
 
@@ -10,45 +12,26 @@ logger = logging.getLogger(__name__)
 
 s3 = boto3.client("s3")
 args = getResolvedOptions(sys.argv, ["PROC_BUCKET"])
+# Optional --S3_CODEC (Glue jobs take no environment variables); defaults to codec.py's S3_CODEC
+if "--S3_CODEC" in sys.argv:
+    codec.S3_CODEC = codec.resolve(getResolvedOptions(sys.argv, ["S3_CODEC"])["S3_CODEC"])
 
 bucket = args["PROC_BUCKET"]
-key = "forecast_data/time_dim/time_dim.json"
+key = time_dim_gen.TIME_DIM_KEY
 
-# check if time_dim file already exists ---
+# Load the existing time_dim (if any) and extend it to the rolling horizon ---
+# Same generator forecast_etl.py calls in-process, so this job is only needed for backfills
 try:
-    s3.head_object(Bucket=bucket, Key=key)
-    logger.info(f"time_dim file already exists at s3://{bucket}/{key}. Skipping creation.")
-    
-except s3.exceptions.ClientError as e:
-    if e.response['Error']['Code'] == "404":
-        logger.info("No existing time_dim found. Proceeding to create a new one.")
-
-        # Define range for 2024–2026 hourly granularity
-        start = pd.Timestamp("2024-01-01 00:00:00")
-        end = pd.Timestamp("2026-12-31 23:00:00")
-        hours = pd.date_range(start, end, freq='H')
-
-        df = pd.DataFrame({
-            "time_id": [d.strftime("%Y%m%d%H") for d in hours],
-            "datetime": hours,
-            "date": hours.date,
-            "hour": hours.hour,
-            "day": hours.day,
-            "month": hours.month,
-            "year": hours.year,
-            "weekday_name": hours.day_name(),
-            "is_weekend": hours.day_of_week >= 5
-        })
-        # Use direct string output
-        json_str = df.to_json(orient="records", lines=True, date_format="iso")  # --- CHANGED: added date_format="iso" ---
-        s3.put_object(
-            Bucket=bucket, 
-            Key=key, 
-            Body=json_str.encode("utf-8"),
-            ContentType="application/json"
-        )
-
-        logger.info(f"Uploaded time_dim with {len(df)} rows to s3://{bucket}/{key}")
-
-    else:
-        raise
+    time_dim = pd.read_json(StringIO(codec.get_text_any(s3, bucket, key)), lines=True)
+    logger.info(f"Loaded existing time_dim with {len(time_dim)} rows from s3://{bucket}/{key}")
+except s3.exceptions.NoSuchKey:
+    logger.info("No existing time_dim found. Proceeding to create a new one.")
+    time_dim = None
+
+time_dim, added = time_dim_gen.extend_time_dim(time_dim)
+if added:
+    json_str = time_dim.to_json(orient="records", lines=True, date_format="iso")
+    key = codec.replace_object(s3, bucket, key, json_str, ContentType="application/json")
+    logger.info(f"Uploaded time_dim with {len(time_dim)} rows ({added} new) to s3://{bucket}/{key}")
+else:
+    logger.info(f"time_dim at s3://{bucket}/{key} already covers the horizon. Skipping upload.")
@@ -0,0 +1,306 @@
+# /scripts/replay.py: parallel date-range replay of forecast_etl outputs, staged and then swapped in
+#
+# Reprocesses the raw files of the given tables whose LastModified falls in [--start, --end] with
+# forecast_etl.transform_file (process_file + casts), without touching checkpoints:
+#
+#   python scripts/replay.py --start 2025-01-01 --end 2025-12-31 --tables forecast_fact,forecast_time_dim --dry-run
+#   python scripts/replay.py --start 2025-01-01 --end 2025-12-31 --tables forecast_fact,forecast_time_dim --workers 16
+#
+# 1. Plan: every live output of a table records the raw LastModified range it covers (raw-lm-min /
+#    raw-lm-max metadata; older outputs are placed between the previous output and their own write
+#    time). The range is widened to whole outputs, so the swap never drops or duplicates rows.
+# 2. Replay: the widened range is split into --chunk-days chunks per table, processed in parallel;
+#    each chunk writes one file to replay/<replay_id>/ in PROC_BUCKET. Progress and ETA are logged.
+# 3. Swap: only if every chunk succeeded, a manifest is written, the staged files are copied into
+#    the live prefixes and the superseded outputs deleted. S3 has no multi-object rename; the swap is
+#    idempotent, so an interrupted one is finished by re-running with --resume-swap <replay_id>.
+# 4. Derived tables (time_dim, rollups, accuracy, forecast_fact_latest) are refreshed from the
+#    replayed rows, as after a normal run (--no-derived skips it); each chunk stages its run slice
+#    under replay/<replay_id>/slices/ and the refresh applies them a chunk at a time.
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import sys
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+# Run from a checkout: the shared modules live in common/, forecast_etl next to this script
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(os.path.dirname(SCRIPTS_DIR), "common"), SCRIPTS_DIR]
+
+import codec  # noqa: E402
+import schema  # noqa: E402
+
+logger = logging.getLogger()
+
+REPLAY_PREFIX = "replay"
+
+etl = None  # forecast_etl, imported by load_etl() once the bucket arguments are known
+
+
+def load_etl(raw_bucket, proc_bucket):
+    """Import forecast_etl with its Glue job arguments; outside Glue only getResolvedOptions is needed from awsglue."""
+    global etl
+    sys.argv = [sys.argv[0], "--RAW_BUCKET", raw_bucket, "--PROC_BUCKET", proc_bucket]
+    try:
+        import awsglue.utils  # noqa: F401
+    except ImportError:
+        glue_utils = types.ModuleType("awsglue.utils")
+        glue_utils.getResolvedOptions = lambda argv, names: {n: argv[argv.index(f"--{n}") + 1] for n in names}
+        sys.modules["awsglue"] = types.ModuleType("awsglue")
+        sys.modules["awsglue.utils"] = glue_utils
+    import forecast_etl
+    etl = forecast_etl
+    return etl
+
+
+def table_prefixes(tables):
+    """Table names ("forecast_fact") or prefixes ("forecast_data/forecast_fact/") -> RAW_PREFIXES entries."""
+    if not tables or tables == "all":
+        return list(etl.RAW_PREFIXES)
+    by_name = {p.rstrip("/").split("/")[-1]: p for p in etl.RAW_PREFIXES}
+    prefixes = []
+    for table in tables.split(","):
+        table = table.strip()
+        prefix = by_name.get(table) or (table.rstrip("/") + "/")
+        if prefix not in etl.RAW_PREFIXES:
+            raise ValueError(f"Unknown table {table!r}; expected one of {sorted(by_name)}")
+        prefixes.append(prefix)
+    return prefixes
+
+
+# --- Plan ---
+def live_outputs(prefix):
+    """Live processed outputs of a prefix with the raw LastModified range each one covers, oldest first."""
+    paginator = etl.s3.get_paginator("list_objects_v2")
+    objects = [o for page in paginator.paginate(Bucket=etl.PROC_BUCKET, Prefix=prefix) for o in page.get("Contents", [])]
+    objects.sort(key=lambda o: o["LastModified"])
+    outputs = []
+    previous = None
+    for obj in objects:
+        meta = etl.s3.head_object(Bucket=etl.PROC_BUCKET, Key=obj["Key"]).get("Metadata", {})
+        if "raw-lm-min" in meta:
+            lo, hi = meta["raw-lm-min"], meta["raw-lm-max"]
+        else:
+            # Written before lineage metadata: a checkpointed run covers raw files since the previous output
+            lo = (previous + timedelta(seconds=1)).isoformat() if previous else ""
+            hi = obj["LastModified"].isoformat()
+        outputs.append({"key": obj["Key"], "lo": lo, "hi": hi})
+        previous = obj["LastModified"]
+    return outputs
+
+
+def raw_files_between(prefix, lo, hi):
+    """(key, last_modified) of raw files with lo <= LastModified <= hi, oldest first."""
+    paginator = etl.s3.get_paginator("list_objects_v2")
+    files = []
+    for page in paginator.paginate(Bucket=etl.RAW_BUCKET, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            lm = obj["LastModified"].isoformat()
+            if lo <= lm <= hi:
+                files.append((obj["Key"], lm))
+    return sorted(files, key=lambda f: f[1])
+
+
+def plan_prefix(prefix, start, end, checkpoint):
+    """
+    Widen [start, end] (inclusive ISO timestamps) to whole live outputs; returns (lo, hi, superseded_keys, raw_files).
+    hi never passes the prefix's checkpoint: later raw files are left to the next forecast_etl run, which
+    would otherwise process them a second time.
+    """
+    outputs = live_outputs(prefix)
+    lo, hi = start, end
+    superseded = set()
+    changed = True
+    while changed:  # widening can pull in further overlapping outputs
+        changed = False
+        for out in outputs:
+            if out["key"] not in superseded and out["lo"] <= hi and out["hi"] >= lo:
+                superseded.add(out["key"])
+                lo, hi = min(lo, out["lo"]), max(hi, out["hi"])
+                changed = True
+    hi = min(hi, checkpoint.get(prefix, ""))
+    return lo, hi, sorted(superseded), raw_files_between(prefix, lo, hi)
+
+
+def chunk_files(raw_files, chunk_days):
+    """Split (key, lm) files into chunks of chunk_days by LastModified date; returns [(chunk_start_date, files)]."""
+    chunks = {}
+    for key, lm in raw_files:
+        day = datetime.fromisoformat(lm).date()
+        chunk_start = day - timedelta(days=(day.toordinal() % chunk_days))
+        chunks.setdefault(chunk_start, []).append((key, lm))
+    return sorted(chunks.items())
+
+
+# --- Replay (runs in pool processes) ---
+def staged_key(replay_id, prefix, chunk_start):
+    name = prefix.rstrip("/").split("/")[-1]
+    return codec.encoded_key(f"{REPLAY_PREFIX}/{replay_id}/{prefix}{name}_replay_{chunk_start:%Y%m%d}.json")
+
+
+def slice_key(replay_id, prefix, chunk_start):
+    return f"{REPLAY_PREFIX}/{replay_id}/slices/{etl.slice_name(prefix)}/{chunk_start:%Y%m%d}.json"
+
+
+def replay_chunk(replay_id, prefix, chunk_start, files, derived=True):
+    """
+    Transform one chunk and stage it; any failed file fails the chunk so the swap never loses rows.
+    With derived, the chunk's run slice is staged too (its key is returned), so the parent never
+    holds the replayed rows.
+    """
+    dfs = []
+    for key, lm in files:
+        df = etl.transform_file(key, prefix, lm)
+        if df is not None and not df.empty:
+            dfs.append(df)
+    if not dfs:
+        return prefix, chunk_start, len(files), 0, None, None, None
+    combined = etl.concat_frames(dfs, prefix)
+    body = codec.compress(schema.output_frame(combined).to_json(orient="records", lines=True, date_format="iso").encode("utf-8"))
+    key = staged_key(replay_id, prefix, chunk_start)
+    etl.s3.put_object(Bucket=etl.PROC_BUCKET, Key=key, Body=body, Metadata=etl.lineage_metadata(files), **codec.object_args())
+    run_slice = etl.derived_slice(prefix, combined) if derived else None
+    if run_slice is not None:
+        run_slice = codec.put_object(
+            etl.s3, etl.PROC_BUCKET, slice_key(replay_id, prefix, chunk_start),
+            run_slice.to_json(orient="records", lines=True, date_format="iso"),
+        )
+    return prefix, chunk_start, len(files), len(combined), key, etl.extract_new_times(combined, prefix), run_slice
+
+
+def replay_chunks(replay_id, tasks, workers, derived=True):
+    """Run (prefix, chunk_start, files) tasks in parallel, logging progress and ETA; returns results or raises."""
+    total_files = sum(len(files) for _, _, files in tasks)
+    done_files = done_rows = 0
+    results = []
+    failed = []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("fork"), initializer=etl.init_worker) as pool:
+        futures = {pool.submit(replay_chunk, replay_id, *task, derived): task for task in tasks}
+        for future in as_completed(futures):
+            prefix, chunk_start, files = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"[replay] {prefix} chunk {chunk_start} failed: {e}", exc_info=True)
+                failed.append((prefix, chunk_start))
+                continue
+            results.append(result)
+            done_files += result[2]
+            done_rows += result[3]
+            elapsed = time.perf_counter() - started
+            eta = elapsed / done_files * (total_files - done_files) if done_files else 0.0
+            logger.info(
+                f"[replay] {len(results) + len(failed)}/{len(tasks)} chunks, {done_files}/{total_files} files, "
+                f"{done_rows} rows, {done_files / elapsed if elapsed else 0:.0f} files/s, "
+                f"elapsed {elapsed:.0f}s, ETA {eta:.0f}s"
+            )
+    if failed:
+        etl.delete_staged([r[6] for r in results if r[6]])
+        raise RuntimeError(f"{len(failed)} chunks failed: {failed}; live tables untouched")
+    return sorted(results, key=lambda r: (r[0], r[1]))
+
+
+# --- Swap ---
+def manifest_key(replay_id):
+    return f"{REPLAY_PREFIX}/{replay_id}/manifest.json"
+
+
+def live_key(staged, replay_id):
+    # replay/<id>/<prefix><name>_replay_<date>.json.gz -> <prefix><name>_replay_<date>_<id>.json.gz
+    key = staged.removeprefix(f"{REPLAY_PREFIX}/{replay_id}/")
+    base = codec.strip_suffix(key).removesuffix(".json")
+    return codec.encoded_key(f"{base}_{replay_id}.json")
+
+
+def swap(manifest):
+    """Copy staged files into the live prefixes, then delete the outputs they supersede (idempotent)."""
+    s3, bucket = etl.s3, etl.PROC_BUCKET
+    for item in manifest["publish"]:
+        s3.copy_object(Bucket=bucket, Key=item["live"], CopySource={"Bucket": bucket, "Key": item["staged"]}, MetadataDirective="COPY")
+    superseded = [k for k in manifest["supersede"] if k not in {i["live"] for i in manifest["publish"]}]
+    staged = [i["staged"] for i in manifest["publish"]]
+    for keys in (superseded, staged):
+        for start in range(0, len(keys), 1000):
+            s3.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": k} for k in keys[start:start + 1000]]})
+    logger.info(f"[replay] Swapped in {len(manifest['publish'])} files, removed {len(superseded)} superseded outputs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay forecast_etl for a date range of raw files, in parallel, with a staged swap")
+    parser.add_argument("--raw-bucket", default=os.environ.get("RAW_BUCKET"))
+    parser.add_argument("--proc-bucket", default=os.environ.get("PROC_BUCKET"))
+    parser.add_argument("--start", help="first raw LastModified date (YYYY-MM-DD, UTC)")
+    parser.add_argument("--end", help="last raw LastModified date (YYYY-MM-DD, inclusive)")
+    parser.add_argument("--tables", default="all", help="comma-separated table names or prefixes (default all)")
+    parser.add_argument("--chunk-days", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--replay-id", default=datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S"))
+    parser.add_argument("--dry-run", action="store_true", help="only print the plan")
+    parser.add_argument("--no-derived", action="store_true", help="do not refresh time_dim and the derived tables")
+    parser.add_argument("--resume-swap", metavar="REPLAY_ID", help="finish an interrupted swap from its manifest")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    if not args.raw_bucket or not args.proc_bucket:
+        parser.error("--raw-bucket/--proc-bucket (or RAW_BUCKET/PROC_BUCKET) are required")
+    load_etl(args.raw_bucket, args.proc_bucket)
+
+    if args.resume_swap:
+        manifest = json.loads(etl.s3.get_object(Bucket=etl.PROC_BUCKET, Key=manifest_key(args.resume_swap))["Body"].read())
+        swap(manifest)
+        return
+    if not args.start or not args.end:
+        parser.error("--start and --end are required")
+
+    start = f"{args.start}T00:00:00+00:00"
+    end = f"{args.end}T23:59:59+00:00"
+    checkpoint = etl.load_checkpoint()
+    tasks = []
+    supersede = []
+    for prefix in table_prefixes(args.tables):
+        if not checkpoint.get(prefix):
+            logger.info(f"[replay] {prefix}: no checkpoint yet, nothing processed to replay")
+            continue
+        lo, hi, superseded, raw_files = plan_prefix(prefix, start, end, checkpoint)
+        chunks = chunk_files(raw_files, args.chunk_days)
+        logger.info(f"[replay] {prefix}: raw {lo or 'beginning'} .. {hi}, {len(raw_files)} files in "
+                    f"{len(chunks)} chunks, supersedes {len(superseded)} outputs")
+        tasks += [(prefix, chunk_start, files) for chunk_start, files in chunks]
+        supersede += superseded
+    if args.dry_run or not tasks:
+        return
+
+    # Largest chunks first keeps the pool busy until the end
+    tasks.sort(key=lambda t: len(t[2]), reverse=True)
+    results = replay_chunks(args.replay_id, tasks, args.workers, not args.no_derived)
+
+    manifest = {
+        "replay_id": args.replay_id,
+        "start": args.start,
+        "end": args.end,
+        "publish": [{"staged": r[4], "live": live_key(r[4], args.replay_id)} for r in results if r[4]],
+        "supersede": supersede,
+    }
+    etl.s3.put_object(Bucket=etl.PROC_BUCKET, Key=manifest_key(args.replay_id), Body=json.dumps(manifest).encode("utf-8"))
+    swap(manifest)
+
+    if not args.no_derived:
+        new_times_parts = [r[5] for r in results if r[5] is not None]
+        # Staged slice keys in chunk order, so later rows of a key stay the newest; finish_run loads them a chunk at a time
+        run_slices = {}
+        for r in results:
+            if r[6] is not None:
+                run_slices.setdefault(r[0], []).append(r[6])
+        try:
+            etl.finish_run(etl.load_existing_time_dim(), new_times_parts, run_slices, replay=True)
+        finally:
+            etl.delete_staged([key for keys in run_slices.values() for key in keys])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+# /scripts/rollups.py: incremental daily and weekly rollups per location, maintained by forecast_etl.py
+#
+# Layout in PROC_BUCKET (one JSON lines file per partition):
+#   rollups/hourly/date=YYYY-MM-DD/hourly.json          latest value per (location_key, time_id)
+#   rollups/daily/date=YYYY-MM-DD/daily.json            one row per location and day
+#   rollups/weekly/week_start=YYYY-MM-DD/weekly.json    one row per location and ISO week (Monday start)
+#
+# Each run only rewrites the hourly/daily partitions of dates present in the new data and the
+# weekly partitions of the weeks containing them, so dashboards read a few hundred rows.
+#
+# Locations are keyed by location_key (see location_key()), so forecasts and measurements of one
+# site land in the same rows.
+import json
+import logging
+import os
+from io import StringIO
+
+import codec
+import pandas as pd
+import schema
+import tracing
+
+logger = logging.getLogger()
+
+ROLLUP_PREFIX = "rollups"
+# Forecast location_id is a digest of the coordinates (api_ingest) and measured location_id comes
+# from the CSVs, so both are mapped to a canonical location_key for the rollup, accuracy and
+# forecast_fact_latest tables. "*" maps every id not listed explicitly.
+ACCURACY_LOCATION_MAP = json.loads(os.environ.get("ACCURACY_LOCATION_MAP", '{"*": 1}'))
+# Persisted dim id -> YYYYMMDDHH time_id per time dim, for facts whose dim row was processed in an earlier run
+HOUR_INDEX_PREFIX = "indexes/hour_ids"
+HOURLY_KEYS = ["location_key", "time_id"]
+MEASURES = ["temperature_c", "rain_mm", "solarenergy_kwh", "water_level_mm", "rain_collected_mm"]
+
+# Columns each raw prefix contributes to the hourly base; facts are placed in time via their own time dim
+ROLLUP_COLUMNS = {
+    "forecast_data/forecast_fact/": ["location_id", "time_id", "temperature_c", "rain_mm"],
+    "forecast_data/forecast_time_dim/": ["forecast_time_id", "time_id"],
+    "measured_data/solar_fact/": ["location_id", "energy_time_id", "solarenergy_kwh"],
+    "measured_data/solar_time_dim/": ["solar_energy_time_id", "time_id"],
+    "measured_data/water_level_fact/": ["location_id", "level_time_id", "water_level_mm", "rain_collected_mm"],
+    "measured_data/water_level_time_dim/": ["water_level_time_id", "time_id"],
+}
+
+# fact prefix -> (fact column referencing the dim, dim prefix, dim id column)
+FACT_TIME_DIMS = {
+    "forecast_data/forecast_fact/": ("time_id", "forecast_data/forecast_time_dim/", "forecast_time_id"),
+    "measured_data/solar_fact/": ("energy_time_id", "measured_data/solar_time_dim/", "solar_energy_time_id"),
+    "measured_data/water_level_fact/": ("level_time_id", "measured_data/water_level_time_dim/", "water_level_time_id"),
+}
+
+
+def location_key(location_ids):
+    """location_id -> canonical location_key (ACCURACY_LOCATION_MAP)."""
+    mapping = {str(k): v for k, v in ACCURACY_LOCATION_MAP.items()}
+    default = mapping.get("*")
+    return location_ids.map(lambda i: mapping.get(str(i), default if default is not None else i)).astype("int64")
+
+
+# --- Stored dim id -> hour lookup ---
+def hour_index_key(dim_prefix):
+    return f"{HOUR_INDEX_PREFIX}/{dim_prefix.rstrip('/').split('/')[-1]}.json"
+
+
+def rebuild_hour_index(s3, bucket, dim_prefix, dim_col):
+    """Build the id -> time_id index of a time dim from its processed outputs (first run without an index)."""
+    index = {}
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=dim_prefix):
+        for obj in sorted(page.get("Contents", []), key=lambda o: o["LastModified"]):
+            body = codec.read_body(s3.get_object(Bucket=bucket, Key=obj["Key"]), obj["Key"]).decode("utf-8")
+            if not body.strip():
+                continue
+            dim = pd.read_json(StringIO(body), lines=True, dtype=False, convert_dates=False, keep_default_dates=False)
+            if {dim_col, "time_id"}.issubset(dim.columns):
+                dim = dim[[dim_col, "time_id"]].dropna()
+                index.update(zip(dim[dim_col].astype("int64").astype(str), dim["time_id"].astype("int64").tolist()))
+    logger.info(f"[rollups] Rebuilt {hour_index_key(dim_prefix)} from processed outputs ({len(index)} ids)")
+    return index
+
+
+def load_hour_index(s3, bucket, dim_prefix, dim_col):
+    """Return (index, stored); stored is False when the index was rebuilt and still has to be written."""
+    try:
+        return json.loads(codec.get_text_any(s3, bucket, hour_index_key(dim_prefix))), True
+    except s3.exceptions.NoSuchKey:
+        return rebuild_hour_index(s3, bucket, dim_prefix, dim_col), False
+
+
+def with_stored_hours(s3, bucket, parts):
+    """
+    Return parts with each time dim slice completed from the stored hour index, so facts whose dim
+    row arrived in an earlier run (e.g. skipped as unchanged by dim_cache) still resolve to an hour.
+    This run's dim rows are added to the index, and take precedence over stored ones.
+    """
+    parts = dict(parts)
+    for fact_prefix, (fact_col, dim_prefix, dim_col) in FACT_TIME_DIMS.items():
+        facts, dim = parts.get(fact_prefix), parts.get(dim_prefix)
+        has_dim = dim is not None and not dim.empty and {dim_col, "time_id"}.issubset(dim.columns)
+        has_facts = facts is not None and not facts.empty and fact_col in facts.columns
+        if not has_dim and not has_facts:
+            continue
+        index, stored = load_hour_index(s3, bucket, dim_prefix, dim_col)
+        run_ids = set()
+        if has_dim:
+            rows = dim[[dim_col, "time_id"]].dropna()
+            new = dict(zip(rows[dim_col].astype("int64").astype(str), rows["time_id"].astype("int64").tolist()))
+            run_ids = set(new)
+            if any(index.get(k) != v for k, v in new.items()):
+                index.update(new)
+                stored = False
+        if not stored:
+            codec.replace_object(s3, bucket, hour_index_key(dim_prefix), json.dumps(index))
+        if has_facts:
+            wanted = set(facts[fact_col].dropna().astype("int64").astype(str)) - run_ids
+            stored = [(int(k), index[k]) for k in wanted if k in index]
+            if stored:
+                stored_dim = pd.DataFrame(stored, columns=[dim_col, "time_id"])
+                # Stored rows first: facts_with_hour keeps the last row per id, i.e. this run's
+                parts[dim_prefix] = pd.concat([stored_dim, dim], ignore_index=True) if has_dim else stored_dim
+                logger.info(f"[rollups] Resolved {len(stored)} {fact_prefix} time ids from {hour_index_key(dim_prefix)}")
+    return parts
+
+
+def facts_with_hour(parts, fact_prefix):
+    """Return this run's rows of a fact prefix with time_id replaced by the YYYYMMDDHH time_id of its time dim."""
+    fact_col, dim_prefix, dim_col = FACT_TIME_DIMS[fact_prefix]
+    facts = parts.get(fact_prefix)
+    if facts is None or facts.empty:
+        return None
+    dim = parts.get(dim_prefix)
+    if dim is None or dim.empty or not {dim_col, "time_id"}.issubset(dim.columns):
+        logger.warning(f"[rollups] No {dim_prefix} rows in this run; skipping {len(facts)} {fact_prefix} rows")
+        return None
+    if not {"location_id", fact_col}.issubset(facts.columns):
+        logger.warning(f"[rollups] {fact_prefix} rows lack location_id/{fact_col}; skipping")
+        return None
+    # Keep the last (newest) dim row per id; frames arrive ordered by LastModified
+    dim = dim[[dim_col, "time_id"]].dropna(subset=["time_id"]).drop_duplicates(dim_col, keep="last")
+    dim = dim.rename(columns={"time_id": "hour_time_id"})
+    joined = facts.merge(dim, left_on=fact_col, right_on=dim_col, how="inner")
+    unmatched = len(facts) - len(joined)
+    if unmatched:
+        logger.warning(f"[rollups] {unmatched} {fact_prefix} rows have no time dim row in this run")
+    joined = joined.drop(columns=list({fact_col, dim_col})).rename(columns={"hour_time_id": "time_id"})
+    joined["time_id"] = joined["time_id"].astype("int64")
+    return joined
+
+
+def hourly_from_run(parts):
+    """Join this run's fact slices to their time dims and combine them into one hourly frame."""
+    frames = []
+    for fact_prefix in FACT_TIME_DIMS:
+        joined = facts_with_hour(parts, fact_prefix)
+        if joined is None:
+            continue
+        joined["location_key"] = location_key(joined["location_id"])
+        measures = [c for c in MEASURES if c in joined.columns]
+        joined = joined[HOURLY_KEYS + measures]
+        frames.append(joined.drop_duplicates(HOURLY_KEYS, keep="last").set_index(HOURLY_KEYS))
+
+    if not frames:
+        return pd.DataFrame(columns=HOURLY_KEYS + MEASURES)
+    hourly = frames[0]
+    for frame in frames[1:]:
+        hourly = hourly.combine_first(frame)
+    hourly = hourly.reset_index()
+    # Compact fact dtypes (Int32, float32; common/schema.py) are aggregated and written as float64
+    measures = [c for c in MEASURES if c in hourly.columns]
+    hourly[measures] = schema.output_frame(hourly[measures]).astype("float64")
+    hourly["location_key"] = hourly["location_key"].astype("int64")
+    hourly["time_id"] = hourly["time_id"].astype("int64")
+    hourly["datetime"] = time_id_to_datetime(hourly["time_id"])
+    return hourly
+
+
+def time_id_to_datetime(time_ids):
+    """YYYYMMDDHH integers -> UTC timestamps."""
+    return pd.to_datetime(time_ids.astype("int64").astype(str), format="%Y%m%d%H", utc=True)
+
+
+def _total(values):
+    # Keep null (not 0) when a location has no values of that measure in the period
+    return values.sum(min_count=1)
+
+
+def aggregate(hourly, period_col):
+    """Aggregate hourly rows to one row per (location_key, period_col)."""
+    hourly = hourly.sort_values("datetime")
+    for col in MEASURES:
+        if col not in hourly.columns:
+            hourly[col] = float("nan")
+    grouped = hourly.groupby(["location_key", period_col])
+    out = grouped.agg(
+        temperature_mean_c=("temperature_c", "mean"),
+        temperature_min_c=("temperature_c", "min"),
+        temperature_max_c=("temperature_c", "max"),
+        rain_total_mm=("rain_mm", _total),
+        rain_collected_total_mm=("rain_collected_mm", _total),
+        solarenergy_total_kwh=("solarenergy_kwh", _total),
+        water_level_first_mm=("water_level_mm", "first"),
+        water_level_last_mm=("water_level_mm", "last"),
+        hours=("time_id", "count"),
+    ).reset_index()
+    out["water_level_delta_mm"] = out["water_level_last_mm"] - out["water_level_first_mm"]
+    return out
+
+
+# --- Partition I/O ---
+def read_partition(s3, bucket, key):
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=key)
+    except s3.exceptions.NoSuchKey:
+        return None
+    body = obj["Body"].read().decode("utf-8")
+    if not body.strip():
+        return None
+    return pd.read_json(StringIO(body), lines=True, dtype=False, convert_dates=False, keep_default_dates=False)
+
+
+def write_partition(s3, bucket, key, df):
+    s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=df.to_json(orient="records", lines=True, date_format="iso").encode("utf-8"),
+    )
+
+
+def hourly_key(day):
+    return f"{ROLLUP_PREFIX}/hourly/date={day}/hourly.json"
+
+
+def update_rollups(s3, bucket, parts):
+    """Upsert this run's hourly values and rebuild the daily/weekly partitions they touch."""
+    with tracing.span("rollup") as sp:
+        new_hourly = hourly_from_run(parts)
+        if new_hourly.empty:
+            logger.info("[rollups] No new hourly values; rollups unchanged.")
+            return
+        new_hourly["date"] = new_hourly["datetime"].dt.strftime("%Y-%m-%d")
+
+        # 1. Upsert hourly base partitions: new non-null values win over stored ones
+        touched_days = sorted(new_hourly["date"].unique())
+        hourly_by_day = {}
+        for day in touched_days:
+            new_rows = new_hourly[new_hourly["date"] == day].drop(columns=["date", "datetime"]).set_index(HOURLY_KEYS)
+            existing = read_partition(s3, bucket, hourly_key(day))
+            if existing is not None:
+                existing = existing[[c for c in existing.columns if c in HOURLY_KEYS + MEASURES]].set_index(HOURLY_KEYS)
+                new_rows = new_rows.combine_first(existing)
+            # Every measure column, null where no source had it, however the run's facts were batched
+            merged = new_rows.reset_index().reindex(columns=HOURLY_KEYS + MEASURES).sort_values(HOURLY_KEYS)
+            merged["datetime"] = time_id_to_datetime(merged["time_id"])
+            write_partition(s3, bucket, hourly_key(day), merged)
+            hourly_by_day[day] = merged
+
+            # 2. Daily rollup of that date
+            daily = aggregate(merged.assign(date=day), "date")
+            write_partition(s3, bucket, f"{ROLLUP_PREFIX}/daily/date={day}/daily.json", daily)
+            sp["count"] += len(merged)
+
+        # 3. Weekly rollups for the ISO weeks containing the touched days
+        week_starts = sorted({(pd.Timestamp(d) - pd.Timedelta(days=pd.Timestamp(d).weekday())).strftime("%Y-%m-%d") for d in touched_days})
+        for week_start in week_starts:
+            days = pd.date_range(week_start, periods=7, freq="D").strftime("%Y-%m-%d")
+            frames = []
+            for d in days:
+                frame = hourly_by_day[d] if d in hourly_by_day else read_partition(s3, bucket, hourly_key(d))
+                if frame is not None:
+                    frames.append(frame)
+            week_hourly = pd.concat(frames, ignore_index=True)
+            week_hourly["datetime"] = time_id_to_datetime(week_hourly["time_id"])
+            weekly = aggregate(week_hourly.assign(week_start=week_start), "week_start")
+            write_partition(s3, bucket, f"{ROLLUP_PREFIX}/weekly/week_start={week_start}/weekly.json", weekly)
+
+        logger.info(f"[rollups] Updated {len(touched_days)} daily and {len(week_starts)} weekly partitions")
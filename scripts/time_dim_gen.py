@@ -0,0 +1,98 @@
+# /scripts/time_dim_gen.py: vectorized hourly time_dim generator, used in-process by forecast_etl.py and generate_time_dim.py
+#
+# time_dim has one row per UTC hour keyed by the integer time_id YYYYMMDDHH. Instead of a fixed
+# date range it is a rolling horizon: extend_time_dim() only generates the hours missing between
+# the stored coverage and whatever the incoming data (and now + TIME_DIM_HORIZON_DAYS) needs.
+import logging
+import os
+
+import pandas as pd
+
+logger = logging.getLogger()
+
+TIME_DIM_KEY = "forecast_data/time_dim/time_dim.json"
+# First hour of a freshly generated dimension
+TIME_DIM_START = os.environ.get("TIME_DIM_START", "2024-01-01")
+# Hours ahead of now kept generated, so forecast hours are covered before their data arrives
+TIME_DIM_HORIZON_DAYS = int(os.environ.get("TIME_DIM_HORIZON_DAYS", "16"))
+
+
+def hour_time_ids(hours):
+    """DatetimeIndex of hours -> int64 YYYYMMDDHH time_ids, without per-row string formatting."""
+    return (hours.year.astype("int64") * 1000000 + hours.month * 10000 + hours.day * 100 + hours.hour).astype("int64")
+
+
+def time_ids_to_hours(time_ids):
+    """YYYYMMDDHH values -> naive UTC hours; unparseable ids become NaT."""
+    ids = pd.to_numeric(pd.Series(time_ids), errors="coerce").dropna().astype("int64")
+    return pd.to_datetime(ids.astype(str), format="%Y%m%d%H", errors="coerce")
+
+
+def calendar_rows(hours):
+    """Calendar rows for a DatetimeIndex of hours."""
+    return pd.DataFrame({
+        "time_id": hour_time_ids(hours),
+        "datetime": hours,
+        "date": hours.normalize(),
+        "hour": hours.hour,
+        "day": hours.day,
+        "month": hours.month,
+        "year": hours.year,
+        "weekday_name": hours.day_name(),
+        "is_weekend": hours.dayofweek >= 5,
+    })
+
+
+def build_time_dim(start, end):
+    """Calendar rows for every hour in [start, end]."""
+    return calendar_rows(pd.date_range(pd.Timestamp(start).floor("h"), pd.Timestamp(end).floor("h"), freq="h"))
+
+
+def horizon_end(now=None):
+    now = pd.Timestamp.now(tz="UTC") if now is None else pd.Timestamp(now)
+    if now.tzinfo is not None:
+        now = now.tz_convert("UTC").tz_localize(None)
+    return now.floor("h") + pd.Timedelta(days=TIME_DIM_HORIZON_DAYS)
+
+
+def extend_time_dim(time_dim, time_ids=None, now=None):
+    """Extend time_dim to cover time_ids and the rolling horizon; returns (time_dim, rows_added).
+
+    Only hours outside the stored [first, last] coverage (or missing inside it) are generated,
+    so a covered run adds nothing and the caller can skip rewriting the dimension.
+    """
+    needed = time_ids_to_hours(time_ids) if time_ids is not None else pd.Series(dtype="datetime64[ns]")
+    invalid = int(needed.isna().sum())
+    if invalid:
+        logger.warning(f"[time_dim] Ignoring {invalid} time_ids that are not YYYYMMDDHH hours")
+    needed = needed.dropna()
+
+    start = needed.min() if not needed.empty else pd.Timestamp(TIME_DIM_START)
+    end = max(needed.max(), horizon_end(now)) if not needed.empty else horizon_end(now)
+
+    if time_dim is None or time_dim.empty or "time_id" not in time_dim.columns:
+        generated = build_time_dim(min(start, pd.Timestamp(TIME_DIM_START)), end)
+        logger.info(f"[time_dim] Generated {len(generated)} hours up to {end}")
+        return generated, len(generated)
+
+    covered = time_ids_to_hours(time_dim["time_id"]).dropna()
+    first, last = covered.min(), covered.max()
+    frames = [time_dim]
+    if start < first:
+        frames.insert(0, build_time_dim(start, first - pd.Timedelta(hours=1)))
+    if end > last:
+        frames.append(build_time_dim(last + pd.Timedelta(hours=1), end))
+    # Hours inside the coverage that an older, gappy dimension is missing
+    gaps = pd.DatetimeIndex(needed[(needed >= first) & (needed <= last)].unique())
+    gaps = gaps[~hour_time_ids(gaps).isin(time_dim["time_id"].astype("int64"))]
+    if len(gaps):
+        frames.append(calendar_rows(gaps))
+    if len(frames) == 1:
+        return time_dim, 0
+
+    extended = pd.concat(frames, ignore_index=True)
+    extended["time_id"] = extended["time_id"].astype("int64")
+    extended = extended.sort_values("time_id", ignore_index=True)
+    added = len(extended) - len(time_dim)
+    logger.info(f"[time_dim] Extended by {added} hours to {extended['time_id'].min()}..{extended['time_id'].max()}")
+    return extended, added